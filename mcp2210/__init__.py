@@ -1,2 +1,5 @@
 from mcp2210.commands import ChipSettings, SPISettings, USBSettings
-from mcp2210.device import MCP2210, CommandException
+from mcp2210.device import (MCP2210, CommandException, DeviceDisconnected, EEPROMVerifyError, ReconnectPolicy,
+                            RetryPolicy, SPITransaction, TransferCancelled)
+from mcp2210.device import (AccessBlocked, AccessDenied, EEPROMWriteFailed, PasswordRejected, SPIBusUnavailable,
+                            TransferInProgress)
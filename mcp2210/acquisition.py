@@ -0,0 +1,288 @@
+"""Fixed-rate acquisition of SPI samples on a dedicated thread.
+
+Usage:
+    >>> acquisition = Acquisition(dev, b"\x01\x80\x00", rate=1000, capacity=4096)
+    >>> acquisition.start()
+    >>> for timestamp, frame in acquisition:
+    ...     process(frame)
+    >>> acquisition.stop()
+    >>> acquisition.stats
+
+Each period runs the same transfer, or the same short list of SPITransactions, and stores the data
+returned as one frame in a preallocated ring buffer. The schedule is kept against a monotonic clock:
+each period starts at a fixed offset from the start time rather than a fixed delay after the last, so
+lateness does not accumulate into drift. Periods that cannot start before the next one is due are
+skipped and counted as overruns.
+"""
+from array import array
+import math
+import threading
+import time
+from mcp2210.device import SPITransaction, _clock
+
+
+class AcquisitionStats(object):
+    """Timing statistics for an Acquisition.
+
+    Attributes:
+      rate: The target rate in frames per second.
+      frames: The number of frames acquired.
+      overruns: The number of scheduled periods skipped because the acquisition was running late.
+      dropped: The number of frames overwritten before the consumer read them.
+      elapsed: Time in seconds from the first scheduled period to the last frame.
+      max_lateness: The largest delay in seconds between when a period was due and when it started.
+      max_transfer_time: The longest time in seconds a period's transfers took.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.frames = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.elapsed = 0.0
+        self.max_lateness = 0.0
+        self.max_transfer_time = 0.0
+        self._lateness = 0.0
+        self._lateness_squared = 0.0
+        self._transfer_time = 0.0
+
+    def _add(self, lateness, transfer_time):
+        self.frames += 1
+        self._lateness += lateness
+        self._lateness_squared += lateness * lateness
+        self._transfer_time += transfer_time
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        if transfer_time > self.max_transfer_time:
+            self.max_transfer_time = transfer_time
+
+    @property
+    def achieved_rate(self):
+        """The rate in frames per second actually achieved."""
+        if self.frames < 2 or not self.elapsed:
+            return 0.0
+        return (self.frames - 1) / self.elapsed
+
+    @property
+    def mean_lateness(self):
+        """The mean delay in seconds between when a period was due and when it started."""
+        return self._lateness / self.frames if self.frames else 0.0
+
+    @property
+    def jitter(self):
+        """The standard deviation, in seconds, of the time each period started relative to schedule."""
+        if not self.frames:
+            return 0.0
+        mean = self.mean_lateness
+        return math.sqrt(max(self._lateness_squared / self.frames - mean * mean, 0.0))
+
+    @property
+    def mean_transfer_time(self):
+        """The mean time in seconds a period's transfers took."""
+        return self._transfer_time / self.frames if self.frames else 0.0
+
+    @property
+    def sustainable_rate(self):
+        """An estimate of the highest rate the adapter can sustain, from the mean transfer time."""
+        if not self._transfer_time:
+            return 0.0
+        return self.frames / self._transfer_time
+
+    def __repr__(self):
+        return "<AcquisitionStats frames=%d rate=%.1f/%.1f overruns=%d dropped=%d jitter=%.6f>" % (
+            self.frames, self.achieved_rate, self.rate, self.overruns, self.dropped, self.jitter)
+
+
+class Acquisition(object):
+    """Runs a fixed SPI transfer at a target rate, collecting the results in a ring buffer.
+
+    Frames can be consumed with a callback, which is called on the acquisition thread, or by iterating
+    over the acquisition from another thread. If an iterating consumer falls more than `capacity`
+    frames behind, the oldest frames are overwritten and counted in stats.dropped.
+
+    The ring buffer is exposed as `buffer`, a bytearray of `capacity * frame_size` bytes, and
+    `timestamps`, an array of doubles, so it can be wrapped without copying, for instance with
+    numpy.frombuffer(acquisition.buffer, dtype).reshape(acquisition.capacity, -1).
+
+    Attributes:
+      frame_size: The number of bytes in each frame.
+      capacity: The number of frames the ring buffer holds.
+      stats: AcquisitionStats for the acquisition so far.
+    """
+
+    def __init__(self, device, data, rate, capacity=1024, callback=None):
+        """Constructor.
+
+        Arguments:
+          device: An MCP2210. It should not be used by other threads while the acquisition runs.
+          data: The data to transfer each period, or a list of SPITransactions to run each period.
+            The frame is the data returned, concatenated in order.
+          rate: The target rate in frames per second.
+          capacity: The number of frames the ring buffer holds, at least 2, since the slot being
+            filled cannot be read.
+          callback: A function called with (timestamp, frame) after each frame is acquired. The
+            frame is a memoryview into the ring buffer, only valid for the duration of the call.
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        if capacity < 2:
+            raise ValueError("Capacity must be at least 2")
+        self.device = device
+        if isinstance(data, (list, tuple)):
+            self._transactions = [SPITransaction(*transaction) for transaction in data]
+            self.frame_size = sum(len(transaction.data) for transaction in self._transactions)
+            self._data = None
+        else:
+            self._transactions = None
+            self._data = bytes(bytearray(data))
+            self.frame_size = len(self._data)
+        self.period = 1.0 / rate
+        self.capacity = capacity
+        self.callback = callback
+        self.buffer = bytearray(capacity * self.frame_size)
+        self.timestamps = array('d', [0.0]) * capacity
+        self.stats = AcquisitionStats(rate)
+        self.error = None
+        self._view = memoryview(self.buffer)
+        self._written = 0
+        self._read = 0
+        self._thread_done = False
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _frame(self, index):
+        offset = (index % self.capacity) * self.frame_size
+        return self._view[offset:offset + self.frame_size]
+
+    def _acquire_into(self, frame):
+        if self._data is not None:
+            self._transfer.transfer_into(self._data, frame)
+            return
+        offset = 0
+        for response in self.device.transfer_batch(self._transactions, reorder=False):
+            frame[offset:offset + len(response)] = response
+            offset += len(response)
+
+    def run(self, frames=None, duration=None):
+        """Runs the acquisition on the calling thread until stop() is called, or a number of frames or
+        a duration is reached.
+        """
+        if self._data is not None:
+            self._transfer = self.device.fixed_size_transfer(self.frame_size)
+        stats = self.stats
+        period = self.period
+        started = _clock()
+        deadline = None if duration is None else started + duration
+        scheduled = started
+        stopped = self._stop.is_set
+        while not stopped():
+            now = _clock()
+            if scheduled > now:
+                time.sleep(scheduled - now)
+                now = _clock()
+            elif now - scheduled >= period:
+                # Running late: skip the periods that were missed, keeping to the original schedule.
+                missed = int((now - scheduled) / period)
+                stats.overruns += missed
+                scheduled += missed * period
+            if deadline is not None and scheduled >= deadline:
+                break
+
+            index = self._written
+            frame = self._frame(index)
+            self._acquire_into(frame)
+            finished = _clock()
+            self.timestamps[index % self.capacity] = now
+            stats._add(now - scheduled, finished - now)
+            stats.elapsed = now - started
+            with self._condition:
+                self._written = index + 1
+                self._condition.notify_all()
+            if self.callback is not None:
+                self.callback(now, frame)
+
+            scheduled += period
+            if frames is not None and stats.frames >= frames:
+                break
+
+    def _run_thread(self, frames, duration):
+        try:
+            self.run(frames, duration)
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._condition:
+                self._thread_done = True
+                self._condition.notify_all()
+
+    def start(self, frames=None, duration=None):
+        """Starts the acquisition on a dedicated thread, optionally stopping after a number of frames or
+        a duration.
+        """
+        if self._thread is not None:
+            raise RuntimeError("Acquisition is already running")
+        self._stop.clear()
+        self._thread_done = False
+        self._thread = threading.Thread(target=self._run_thread, args=(frames, duration),
+                                        name="mcp2210-acquisition")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops an acquisition started with start(), waiting for its thread to finish.
+
+        Any exception raised on the acquisition thread is raised again here.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def read(self, timeout=None):
+        """Returns the next (timestamp, frame) pair not yet read, waiting for it if necessary.
+
+        The frame is returned as bytes. Returns None if the timeout expires, or if the acquisition
+        thread has finished and every frame has been read.
+        """
+        # Condition.wait returns None on Python 2, so time out against a deadline instead.
+        deadline = None if timeout is None else _clock() + timeout
+        with self._condition:
+            while self._read >= self._written:
+                if self._thread is None or self._thread_done:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - _clock()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+            # The slot after the newest frame is the one being filled, so it cannot be read.
+            oldest = self._written - self.capacity + 1
+            if self._read < oldest:
+                self.stats.dropped += oldest - self._read
+                self._read = oldest
+            index = self._read
+            self._read += 1
+            return self.timestamps[index % self.capacity], self._frame(index).tobytes()
+
+    def __iter__(self):
+        """Yields (timestamp, frame) pairs until the acquisition thread finishes."""
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
@@ -0,0 +1,216 @@
+"""asyncio front end for MCP2210 devices.
+
+Each AsyncMCP2210 owns a dedicated I/O thread that performs all HID traffic for its device, so blocking
+reads never stall the event loop and a single loop can drive many adapters at once. Requires Python 3.5
+or later.
+
+Usage:
+    >>> dev = await AsyncMCP2210.open(my_vid, my_pid)
+    >>> await dev.transfer(b"data")
+    >>> settings = await dev.get('transfer_settings')
+    >>> await dev.gpio.set(3, 1)
+    >>> await dev.close()
+"""
+import asyncio
+import functools
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from mcp2210.device import MCP2210
+
+
+class _Job(object):
+    """A call waiting to run, or running, on a device's I/O thread."""
+
+    def __init__(self, loop, future, function, args):
+        self.loop = loop
+        self.future = future
+        self.function = function
+        self.args = args
+        self.lock = threading.Lock()
+        self.running = False
+        self.cancelled = False
+
+
+def _set_result(future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+
+def _set_exception(future, exception):
+    if not future.cancelled():
+        future.set_exception(exception)
+
+
+class AsyncGPIOSettings(object):
+    """Awaitable access to GPIO pin settings - direction or status."""
+
+    def __init__(self, device, attribute):
+        self._device = device
+        self._attribute = attribute
+
+    def _settings(self):
+        return getattr(self._device.device, self._attribute)
+
+    async def get_raw(self):
+        """Returns the settings for all pins as a bitmask."""
+        return await self._device._call(lambda: self._settings().raw)
+
+    async def set_raw(self, value):
+        """Sets all pins from a bitmask."""
+        def set_raw():
+            self._settings().raw = value
+        await self._device._call(set_raw)
+
+    async def get(self, pin):
+        """Returns the setting for a single pin."""
+        return await self._device._call(lambda: self._settings()[pin])
+
+    async def set(self, pin, value):
+        """Sets a single pin."""
+        await self._device._call(self._settings().__setitem__, pin, value)
+
+
+class AsyncEEPROMData(object):
+    """Awaitable access to data stored in the MCP2210 EEPROM."""
+
+    def __init__(self, device):
+        self._device = device
+
+    async def read(self, key):
+        """Reads a byte or a slice of the EEPROM."""
+        return await self._device._call(lambda: self._device.device.eeprom[key])
+
+    async def write(self, key, value):
+        """Writes a byte or a slice of the EEPROM."""
+        await self._device._call(self._device.device.eeprom.__setitem__, key, value)
+
+
+class AsyncMCP2210(object):
+    """asyncio interface to an MCP2210 device.
+
+    All calls are queued to a per-device I/O thread and run there in order. Cancelling a coroutine
+    whose call is still queued drops the call; cancelling a running transfer cancels it on the device
+    with a CancelTransferCommand.
+    """
+
+    def __init__(self, device=None):
+        """Constructor.
+
+        Arguments:
+          device: The MCP2210 instance to drive. Use AsyncMCP2210.open() to open a device on the I/O
+            thread instead.
+        """
+        self.device = device
+        self.gpio_direction = AsyncGPIOSettings(self, 'gpio_direction')
+        self.gpio = AsyncGPIOSettings(self, 'gpio')
+        self.eeprom = AsyncEEPROMData(self)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="mcp2210-io")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    async def open(cls, *args, **kwargs):
+        """Opens an MCP2210 on a new I/O thread. Takes the same arguments as MCP2210."""
+        self = cls()
+        try:
+            self.device = await self._call(functools.partial(MCP2210, *args, **kwargs))
+        except BaseException:
+            self._queue.put(None)
+            raise
+        return self
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with job.lock:
+                if job.cancelled:
+                    continue
+                job.running = True
+                if self.device is not None:
+                    self.device._abort_requested = False
+            try:
+                result = job.function(*job.args)
+            except BaseException as e:
+                job.loop.call_soon_threadsafe(_set_exception, job.future, e)
+            else:
+                job.loop.call_soon_threadsafe(_set_result, job.future, result)
+            finally:
+                with job.lock:
+                    job.running = False
+
+    async def _call(self, function, *args):
+        """Runs function on the I/O thread and returns its result."""
+        loop = asyncio.get_event_loop()
+        job = _Job(loop, loop.create_future(), function, args)
+        self._queue.put(job)
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            with job.lock:
+                job.cancelled = True
+                if job.running:
+                    self.device.abort()
+            raise
+
+    async def close(self):
+        """Closes the device and stops the I/O thread."""
+        try:
+            await self._call(self.device.close)
+        finally:
+            self._queue.put(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def sendCommand(self, command):
+        """Sends a Command object to the MCP2210 and returns its response."""
+        return await self._call(self.device.sendCommand, command)
+
+    async def get(self, name):
+        """Returns the value of a device setting, such as 'transfer_settings' or 'product_name'."""
+        self._check_setting(name)
+        return await self._call(getattr, self.device, name)
+
+    async def set(self, name, value):
+        """Sets the value of a device setting, such as 'transfer_settings' or 'product_name'."""
+        self._check_setting(name)
+        await self._call(setattr, self.device, name, value)
+
+    def _check_setting(self, name):
+        if name not in dict(type(self.device).remote_properties()):
+            raise AttributeError("MCP2210 has no setting named %r" % name)
+
+    async def authenticate(self, password):
+        """Authenticates against a password-protected MCP2210."""
+        await self._call(self.device.authenticate, password)
+
+    async def read_event_count(self, reset=False):
+        """Reads the number of events counted on the GP6 interrupt pin."""
+        return await self._call(self.device.read_event_count, reset)
+
+    async def transfer(self, data):
+        """Transfers data over SPI and returns the data returned by the SPI device."""
+        return await self._call(self.device.transfer, data)
+
+    async def transfer_into(self, data, buffer):
+        """Transfers data over SPI, writing the data returned by the SPI device into buffer."""
+        return await self._call(self.device.transfer_into, data, buffer)
+
+    async def transfer_batch(self, transactions, reorder=True):
+        """Runs a list of SPI transactions. See MCP2210.transfer_batch."""
+        return await self._call(self.device.transfer_batch, transactions, reorder)
+
+    async def cancel_transfer(self):
+        """Cancels any ongoing transfers."""
+        await self._call(self.device.cancel_transfer)
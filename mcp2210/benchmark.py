@@ -0,0 +1,258 @@
+"""Transfer, pipelining, settings, GPIO, EEPROM and register map benchmarks against the simulated MCP2210.
+
+Results are written as JSON so runs from different versions can be compared:
+
+    $ python -m mcp2210.benchmark --output before.json
+    $ python -m mcp2210.benchmark --output after.json --baseline before.json
+"""
+from __future__ import print_function
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+from mcp2210.device import MCP2210, SPITransaction, _clock
+from mcp2210.registers import Register, RegisterMap
+from mcp2210.simulator import RegisterPeripheral, SimulatedMCP2210
+
+
+PAYLOAD_SIZES = (8, 64, 256, 1024, 4096, 16384)
+BIT_RATES = (1000000, 3000000, 12000000)
+QUICK_PAYLOAD_SIZES = (8, 1024)
+QUICK_BIT_RATES = (12000000,)
+
+
+def _device(frame_time, bit_rate=None, peripheral=None):
+    device = MCP2210(0x04D8, 0x00DE, hid_device=SimulatedMCP2210(frame_time=frame_time, peripheral=peripheral))
+    if bit_rate is not None:
+        settings = device.transfer_settings
+        settings.bit_rate = bit_rate
+        device.transfer_settings = settings
+    return device
+
+
+def _measure(function, repeat):
+    """Calls function repeat times after one warm up call, returning each call's duration."""
+    function()
+    durations = []
+    for i in range(repeat):
+        started = _clock()
+        function()
+        durations.append(_clock() - started)
+    return durations
+
+
+def _summarise(key, durations, nbytes=0, **fields):
+    durations = sorted(durations)
+    mean = sum(durations) / len(durations)
+    result = {
+        'key': key,
+        'runs': len(durations),
+        'mean': mean,
+        'min': durations[0],
+        'p50': durations[len(durations) // 2],
+        'p95': durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+        'max': durations[-1],
+    }
+    if nbytes:
+        result['bytes'] = nbytes
+        result['throughput'] = nbytes / mean if mean else 0.0
+    result.update(fields)
+    return result
+
+
+def bench_transfers(frame_time, repeat, sizes, bit_rates):
+    """Measures transfer latency and throughput for each access pattern, payload size and bit rate."""
+    results = []
+    for bit_rate in bit_rates:
+        device = _device(frame_time, bit_rate)
+        for size in sizes:
+            payload = bytes(bytearray(i & 0xFF for i in range(size)))
+            buffer = bytearray(size)
+            fixed = device.fixed_size_transfer(size)
+            half = size // 2 or 1
+            batch = [SPITransaction(0x01, 0, bit_rate, payload[:half]),
+                     SPITransaction(0x02, 0, bit_rate, payload[half:] or payload),
+                     SPITransaction(0x01, 0, bit_rate, payload[:half]),
+                     SPITransaction(0x02, 0, bit_rate, payload[half:] or payload)]
+            batch_bytes = sum(len(transaction.data) for transaction in batch)
+            patterns = [
+                ('transfer', lambda: device.transfer(payload), size),
+                ('transfer_into', lambda: device.transfer_into(payload, buffer), size),
+                ('fixed_size', lambda: fixed.transfer_into(payload, buffer), size),
+                ('batch', lambda: device.transfer_batch(batch), batch_bytes),
+                ('stream', lambda: device.transfer_stream(io.BytesIO(payload), io.BytesIO()), size),
+            ]
+            for pattern, function, nbytes in patterns:
+                key = 'transfer/%s/size=%d/bit_rate=%d' % (pattern, size, bit_rate)
+                results.append(_summarise(key, _measure(function, repeat), nbytes,
+                                          pattern=pattern, size=size, bit_rate=bit_rate))
+    return results
+
+
+PIPELINE_DEPTH = 4
+
+
+def bench_pipelining(frame_time, repeat, sizes, bit_rates):
+    """Compares lock step transfers with pipelined ones, reporting the rate reports are exchanged at."""
+    results = []
+    for bit_rate in bit_rates:
+        device = _device(frame_time, bit_rate)
+        for size in sizes:
+            payload = bytes(bytearray(i & 0xFF for i in range(size)))
+            for depth in (1, PIPELINE_DEPTH):
+                device.pipeline_depth = depth
+                durations = _measure(lambda: device.transfer(payload), repeat)
+                key = 'pipeline/depth=%d/size=%d/bit_rate=%d' % (depth, size, bit_rate)
+                mean = sum(durations) / len(durations)
+                results.append(_summarise(key, durations, size, depth=depth, size=size, bit_rate=bit_rate,
+                                          reports_per_second=device.last_transfer.reports / mean))
+    return results
+
+
+def bench_settings(frame_time, repeat):
+    """Measures the cost of reading, writing and prefetching settings."""
+    device = _device(frame_time)
+    rates = [1000000, 2000000]
+
+    def read():
+        device.invalidate_settings(['transfer_settings'])
+        device.transfer_settings
+
+    def write():
+        settings = device.transfer_settings
+        settings.bit_rate = rates[0]
+        rates.reverse()
+        device.transfer_settings = settings
+
+    def write_unchanged():
+        device.transfer_settings = device.transfer_settings
+
+    def prefetch():
+        device.invalidate_settings()
+        device.prefetch_settings()
+
+    return [
+        _summarise('settings/read', _measure(read, repeat)),
+        _summarise('settings/write', _measure(write, repeat)),
+        _summarise('settings/write_unchanged', _measure(write_unchanged, repeat)),
+        _summarise('settings/prefetch', _measure(prefetch, repeat)),
+    ]
+
+
+def bench_gpio(frame_time, repeat):
+    """Measures single pin writes, batched pin writes and snapshot reads."""
+    device = _device(frame_time)
+
+    def single():
+        for pin in range(4):
+            device.gpio[pin] = not device.gpio[pin]
+
+    def batch():
+        with device.gpio.batch():
+            for pin in range(4):
+                device.gpio[pin] = not device.gpio[pin]
+
+    return [
+        _summarise('gpio/4_pins', _measure(single, repeat)),
+        _summarise('gpio/4_pins_batched', _measure(batch, repeat)),
+        _summarise('gpio/snapshot', _measure(device.gpio_snapshot, repeat)),
+    ]
+
+
+def bench_eeprom(frame_time, repeat):
+    """Measures loading the EEPROM and writing a 64 byte record, changed and unchanged."""
+    device = _device(frame_time)
+    records = [bytes(bytearray(range(64))), bytes(bytearray(range(64, 128)))]
+
+    def write_changed():
+        device.eeprom[0:64] = records[0]
+        records.reverse()
+
+    def write_unchanged():
+        device.eeprom[0:64] = records[0]
+
+    # EEPROM operations are slow, so fewer repeats are enough.
+    repeat = max(repeat // 4, 1)
+    return [
+        _summarise('eeprom/load', _measure(device.eeprom.load, repeat), 256),
+        _summarise('eeprom/write_64_changed', _measure(write_changed, repeat), 64),
+        _summarise('eeprom/write_64_unchanged', _measure(write_unchanged, repeat), 64),
+    ]
+
+
+def bench_registers(frame_time, repeat):
+    """Measures reading eight volatile registers one at a time and as a burst, and cached reads."""
+    device = _device(frame_time, peripheral=RegisterPeripheral())
+    names = ['r%d' % i for i in range(8)]
+    volatile = RegisterMap(device, [Register(name, i, volatile=True) for i, name in enumerate(names)])
+    cached = RegisterMap(device, [Register(name, i) for i, name in enumerate(names)])
+
+    def single():
+        for name in names:
+            volatile.read(name)
+
+    return [
+        _summarise('registers/read_8_single', _measure(single, repeat), 8),
+        _summarise('registers/read_8_burst', _measure(lambda: volatile.read_many(names), repeat), 8),
+        _summarise('registers/read_8_cached', _measure(lambda: cached.read_many(names), repeat), 8),
+    ]
+
+
+def run(frame_time=0.001, repeat=20, quick=False):
+    """Runs every benchmark and returns the results as a JSON-serialisable dict."""
+    sizes = QUICK_PAYLOAD_SIZES if quick else PAYLOAD_SIZES
+    bit_rates = QUICK_BIT_RATES if quick else BIT_RATES
+    results = []
+    results.extend(bench_transfers(frame_time, repeat, sizes, bit_rates))
+    results.extend(bench_pipelining(frame_time, repeat, sizes, bit_rates))
+    results.extend(bench_settings(frame_time, repeat))
+    results.extend(bench_gpio(frame_time, repeat))
+    results.extend(bench_eeprom(frame_time, repeat))
+    results.extend(bench_registers(frame_time, repeat))
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'frame_time': frame_time,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(results, baseline):
+    """Returns lines comparing the mean time of each result with a baseline run."""
+    before = dict((result['key'], result) for result in baseline['results'])
+    lines = []
+    for result in results['results']:
+        if result['key'] in before and before[result['key']]['mean']:
+            ratio = result['mean'] / before[result['key']]['mean']
+            lines.append("%-60s %10.3fms %+7.1f%%" % (result['key'], result['mean'] * 1e3, (ratio - 1) * 100))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mcp2210 library against a simulated device.")
+    parser.add_argument('--output', '-o', help="Write results to this JSON file.")
+    parser.add_argument('--baseline', '-b', help="Compare results with this earlier JSON results file.")
+    parser.add_argument('--frame-time', type=float, default=0.001,
+                        help="Simulated USB frame time in seconds (default: 0.001, 0 to disable).")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs of each benchmark (default: 20).")
+    parser.add_argument('--quick', action='store_true', help="Only run a small set of transfer benchmarks.")
+    args = parser.parse_args(argv)
+
+    results = run(args.frame_time, args.repeat, args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines = compare(results, json.load(f))
+    else:
+        lines = ["%-60s %10.3fms" % (result['key'], result['mean'] * 1e3) for result in results['results']]
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
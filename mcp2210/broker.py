@@ -0,0 +1,576 @@
+"""A broker process that shares MCP2210 adapters between processes over a Unix domain socket.
+
+Only one process at a time can hold an adapter's HID handle. The broker opens each adapter once and
+serves transfers, settings, GPIO and EEPROM requests from any number of clients. Clients use
+MCP2210Proxy, which offers the same interface as MCP2210 for those operations.
+
+Running a broker for every attached adapter:
+    $ python -m mcp2210.broker --socket /tmp/mcp2210.sock --vid 0x04d8 --pid 0x00de
+
+Using it from a client process:
+    >>> dev = MCP2210Proxy('/tmp/mcp2210.sock', key=serial_number)
+    >>> dev.transfer(b"data")
+
+Each adapter's requests run one at a time on its own thread. Requests with a lower priority value
+run first; requests of the same priority are taken from each client in turn, so a client queueing
+many requests does not hold up the others. Identical settings reads that are queued at the same time
+are answered with a single read.
+
+The wire protocol is a sequence of frames, each a HEADER followed by a body of `length` bytes.
+Requests carry an opcode and a priority; responses carry a status in place of the opcode.
+"""
+from __future__ import print_function
+from collections import OrderedDict
+from ctypes import Structure, addressof, sizeof, string_at
+import argparse
+import heapq
+import itertools
+import os
+import socket
+import struct
+import threading
+from mcp2210 import commands
+from mcp2210.device import MAX_TRANSACTION_SIZE, MCP2210, CommandException, SPITransaction, command_exception
+
+
+# Body length, request ID, opcode or status, priority.
+HEADER = struct.Struct('<IIBB2x')
+# Chip select, SPI mode, bit rate and data length of a transaction in a batch.
+TRANSACTION = struct.Struct('<HBIH')
+
+OP_OPEN = 0x01
+OP_TRANSFER = 0x10
+OP_TRANSFER_BATCH = 0x11
+OP_CANCEL_TRANSFER = 0x12
+OP_GET = 0x20
+OP_SET = 0x21
+OP_GPIO_GET = 0x30
+OP_GPIO_SET = 0x31
+OP_EEPROM_READ = 0x40
+OP_EEPROM_WRITE = 0x41
+OP_AUTHENTICATE = 0x50
+OP_EVENT_COUNT = 0x60
+
+STATUS_OK = 0x00
+STATUS_COMMAND_ERROR = 0x01  # Body is the MCP2210 status code
+STATUS_VALUE_ERROR = 0x02    # Body is the message
+STATUS_ERROR = 0x03          # Body is the message
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 100
+PRIORITY_LOW = 200
+
+_GPIO_ATTRIBUTES = ('gpio', 'gpio_direction')
+_SETTINGS = dict((name, prop) for name, prop in MCP2210.remote_properties())
+
+
+class BrokerError(Exception):
+    """Thrown by MCP2210Proxy when the broker fails a request for a reason other than a device error."""
+
+
+def _recv_exactly(sock, length):
+    """Reads exactly length bytes from a socket, or returns None if it is closed first."""
+    data = bytearray(length)
+    view = memoryview(data)
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:])
+        if not count:
+            return None
+        received += count
+    return bytes(data)
+
+
+def _encode_value(value):
+    """Encodes a settings value: a settings structure, or a string."""
+    if isinstance(value, Structure):
+        return b'S' + type(value).__name__.encode('ascii') + b'\0' + string_at(addressof(value), sizeof(value))
+    return b'U' + value.encode('utf8')
+
+
+def _decode_value(data):
+    if data[:1] == b'S':
+        name, _, raw = data[1:].partition(b'\0')
+        cls = getattr(commands, name.decode('ascii'), None)
+        if not (isinstance(cls, type) and issubclass(cls, commands.Settings)):
+            raise ValueError("Unknown settings type %r" % name)
+        return cls.from_buffer_copy(raw)
+    return data[1:].decode('utf8')
+
+
+def _encode_batch(transactions, reorder):
+    transactions = [SPITransaction(*transaction) for transaction in transactions]
+    parts = [struct.pack('<BH', bool(reorder), len(transactions))]
+    for i, transaction in enumerate(transactions):
+        data = bytes(bytearray(transaction.data))
+        if len(data) > MAX_TRANSACTION_SIZE:
+            raise ValueError("Transaction %d is longer than the %d bytes allowed in one transaction" %
+                             (i, MAX_TRANSACTION_SIZE))
+        parts.append(TRANSACTION.pack(transaction.chip_select, transaction.spi_mode, transaction.bit_rate, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def _decode_batch(body):
+    reorder, count = struct.unpack_from('<BH', body)
+    offset = 3
+    transactions = []
+    for i in range(count):
+        chip_select, spi_mode, bit_rate, length = TRANSACTION.unpack_from(body, offset)
+        offset += TRANSACTION.size
+        transactions.append(SPITransaction(chip_select, spi_mode, bit_rate, body[offset:offset + length]))
+        offset += length
+    return transactions, bool(reorder)
+
+
+class _Request(object):
+    __slots__ = ('connection', 'request_id', 'opcode', 'body', 'waiters')
+
+    def __init__(self, connection, request_id, opcode, body):
+        self.connection = connection
+        self.request_id = request_id
+        self.opcode = opcode
+        self.body = body
+        self.waiters = []
+
+
+class _DeviceQueue(object):
+    """The queue of requests for one adapter, ordered by priority and then round robin between clients.
+
+    Each client's requests are numbered in rounds, starting no earlier than the round being served,
+    so a newly active client's request is served before the backlog of a busy one.
+    """
+
+    def __init__(self):
+        self.merged = 0
+        self._condition = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._rounds = {}
+        self._round = 0
+        self._gets = {}
+        self._closed = False
+
+    def put(self, request, priority):
+        with self._condition:
+            if request.opcode == OP_GET:
+                queued = self._gets.get((priority, request.body))
+                if queued is not None:
+                    queued.waiters.append((request.connection, request.request_id))
+                    self.merged += 1
+                    return
+                self._gets[(priority, request.body)] = request
+            round_ = max(self._rounds.get(request.connection, 0), self._round)
+            self._rounds[request.connection] = round_ + 1
+            heapq.heappush(self._heap, (priority, round_, next(self._sequence), request))
+            self._condition.notify()
+
+    def get(self):
+        """Returns the next request, waiting for one, or None once the queue is closed."""
+        with self._condition:
+            while not self._heap and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            priority, self._round, _, request = heapq.heappop(self._heap)
+            if request.opcode == OP_GET:
+                del self._gets[(priority, request.body)]
+            return request
+
+    def forget(self, connection):
+        with self._condition:
+            self._rounds.pop(connection, None)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class _Connection(object):
+    """A client connected to the broker."""
+
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.sock = sock
+        self.queue = None
+        self._lock = threading.Lock()
+
+    def send(self, request_id, status, body=b''):
+        with self._lock:
+            try:
+                self.sock.sendall(HEADER.pack(len(body), request_id, status, 0) + body)
+            except socket.error:
+                pass  # The client has gone; its reader thread cleans up.
+
+    def serve(self):
+        try:
+            while True:
+                header = _recv_exactly(self.sock, HEADER.size)
+                if header is None:
+                    return
+                length, request_id, opcode, priority = HEADER.unpack(header)
+                body = _recv_exactly(self.sock, length)
+                if body is None:
+                    return
+                if opcode == OP_OPEN:
+                    self._open(request_id, body.decode('utf8'))
+                elif self.queue is None:
+                    self.send(request_id, STATUS_ERROR, b"No device opened")
+                else:
+                    self.queue.put(_Request(self, request_id, opcode, body), priority)
+        except socket.error:
+            pass
+        finally:
+            if self.queue is not None:
+                self.queue.forget(self)
+            self.sock.close()
+
+    def _open(self, request_id, key):
+        if not key and self.broker.devices:
+            key = next(iter(self.broker.devices))
+        if key not in self.broker.devices:
+            self.send(request_id, STATUS_ERROR, ("No device %r" % key).encode('utf8'))
+            return
+        if self.queue is not None:
+            self.queue.forget(self)
+        self.queue = self.broker._queues[key]
+        self.send(request_id, STATUS_OK, key.encode('utf8'))
+
+
+def _execute(device, opcode, body):
+    """Runs a request against a device, returning the response body."""
+    if opcode == OP_TRANSFER:
+        return device.transfer(body)
+    elif opcode == OP_TRANSFER_BATCH:
+        transactions, reorder = _decode_batch(body)
+        return b''.join(device.transfer_batch(transactions, reorder))
+    elif opcode == OP_CANCEL_TRANSFER:
+        device.cancel_transfer()
+    elif opcode == OP_GET:
+        name = body.decode('ascii')
+        if name not in _SETTINGS:
+            raise ValueError("No setting named %r" % name)
+        return _encode_value(getattr(device, name))
+    elif opcode == OP_SET:
+        name, _, value = body.partition(b'\0')
+        name = name.decode('ascii')
+        if name not in _SETTINGS:
+            raise ValueError("No setting named %r" % name)
+        setattr(device, name, _decode_value(value))
+    elif opcode == OP_GPIO_GET:
+        return struct.pack('<H', getattr(device, _GPIO_ATTRIBUTES[body[0:1] == b'\x01']).raw)
+    elif opcode == OP_GPIO_SET:
+        which, mask, value = struct.unpack('<BHH', body)
+        gpio = getattr(device, _GPIO_ATTRIBUTES[which == 1])
+        gpio.raw = (gpio.raw & ~mask) | (value & mask)
+    elif opcode == OP_EEPROM_READ:
+        return device.eeprom[:]
+    elif opcode == OP_EEPROM_WRITE:
+        pairs = bytearray(body)
+        with device.eeprom.staged():
+            for i in range(0, len(pairs) - 1, 2):
+                device.eeprom[pairs[i]] = pairs[i + 1]
+    elif opcode == OP_AUTHENTICATE:
+        device.authenticate(body)
+    elif opcode == OP_EVENT_COUNT:
+        return struct.pack('<H', device.read_event_count(body == b'\x01'))
+    else:
+        raise ValueError("Unknown opcode 0x%.2x" % opcode)
+    return b''
+
+
+class Broker(object):
+    """Serves requests for a set of adapters to clients connecting over a Unix domain socket.
+
+    Attributes:
+      path: The path of the socket.
+      devices: An OrderedDict mapping device keys to MCP2210 instances.
+    """
+
+    def __init__(self, path, devices):
+        """Constructor.
+
+        Arguments:
+          path: The path to listen on. Any existing socket file there is replaced.
+          devices: A dict mapping keys, such as serial numbers, to open MCP2210 instances. Clients
+            that do not ask for a key get the first.
+        """
+        self.path = path
+        self.devices = OrderedDict(devices)
+        self._queues = dict((key, _DeviceQueue()) for key in self.devices)
+        self._workers = []
+        self._socket = None
+        self._closed = False
+        self._listening = threading.Event()
+
+    @property
+    def merged_reads(self):
+        """The number of settings reads answered by a read already queued for another client."""
+        return sum(queue.merged for queue in self._queues.values())
+
+    def _work(self, device, queue):
+        while True:
+            request = queue.get()
+            if request is None:
+                return
+            try:
+                status, body = STATUS_OK, _execute(device, request.opcode, request.body)
+            except CommandException as e:
+                status, body = STATUS_COMMAND_ERROR, struct.pack('<B', e.code)
+            except ValueError as e:
+                status, body = STATUS_VALUE_ERROR, str(e).encode('utf8')
+            except Exception as e:
+                status, body = STATUS_ERROR, ("%s: %s" % (type(e).__name__, e)).encode('utf8')
+            request.connection.send(request.request_id, status, body)
+            for connection, request_id in request.waiters:
+                connection.send(request_id, status, body)
+
+    def serve_forever(self):
+        """Listens for and serves clients until close() is called."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        self._socket.listen(16)
+        for key, device in self.devices.items():
+            worker = threading.Thread(target=self._work, args=(device, self._queues[key]),
+                                      name="mcp2210-broker-%s" % key)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        self._listening.set()
+        while not self._closed:
+            try:
+                sock, _ = self._socket.accept()
+            except socket.error:
+                break
+            connection = _Connection(self, sock)
+            thread = threading.Thread(target=connection.serve, name="mcp2210-broker-client")
+            thread.daemon = True
+            thread.start()
+
+    def start(self):
+        """Serves clients on a background thread, returning once the socket is listening."""
+        thread = threading.Thread(target=self.serve_forever, name="mcp2210-broker")
+        thread.daemon = True
+        thread.start()
+        self._listening.wait()
+
+    def close(self):
+        """Stops listening and stops the device threads. The devices themselves are left open."""
+        self._closed = True
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._socket.close()
+        for queue in self._queues.values():
+            queue.close()
+        for worker in self._workers:
+            worker.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class _ProxyGPIO(object):
+    """GPIO pins of a device behind a broker, with the interface of GPIOSettings."""
+
+    def __init__(self, proxy, which):
+        self._proxy = proxy
+        self._which = which
+
+    @property
+    def raw(self):
+        return struct.unpack('<H', self._proxy._call(OP_GPIO_GET, struct.pack('<B', self._which)))[0]
+
+    @raw.setter
+    def raw(self, value):
+        self._proxy._call(OP_GPIO_SET, struct.pack('<BHH', self._which, 0xFFFF, value))
+
+    def __getitem__(self, i):
+        return (self.raw >> i) & 1
+
+    def __setitem__(self, i, value):
+        # The pin is changed by the broker, so concurrent changes to other pins are not lost.
+        self._proxy._call(OP_GPIO_SET, struct.pack('<BHH', self._which, 1 << i, (1 << i) if value else 0))
+
+
+class _ProxyEEPROM(object):
+    """The EEPROM of a device behind a broker, with the indexing interface of EEPROMData."""
+
+    SIZE = 256
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    def __len__(self):
+        return self.SIZE
+
+    def __getitem__(self, key):
+        image = self._proxy._call(OP_EEPROM_READ)
+        if isinstance(key, slice):
+            return image[key]
+        if key < 0:
+            key += self.SIZE
+        if not 0 <= key < self.SIZE:
+            raise IndexError("EEPROM address out of range: %d" % key)
+        return image[key:key + 1]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            addresses = range(*key.indices(self.SIZE))
+            value = bytearray(value)
+            if len(value) != len(addresses):
+                raise ValueError("Expected %d bytes of data, got %d" % (len(addresses), len(value)))
+        else:
+            if key < 0:
+                key += self.SIZE
+            if not 0 <= key < self.SIZE:
+                raise IndexError("EEPROM address out of range: %d" % key)
+            addresses = [key]
+            value = bytearray([value]) if isinstance(value, int) else bytearray(value)
+            if len(value) != 1:
+                raise ValueError("Expected a single byte, got %d" % len(value))
+        body = bytearray()
+        for address, byte in zip(addresses, value):
+            body += bytearray((address, byte))
+        self._proxy._call(OP_EEPROM_WRITE, bytes(body))
+
+
+def _proxy_property(name, doc):
+    def get(self):
+        return _decode_value(self._call(OP_GET, name.encode('ascii')))
+
+    def set(self, value):
+        self._call(OP_SET, name.encode('ascii') + b'\0' + _encode_value(value))
+
+    return property(get, set, doc=doc)
+
+
+class MCP2210Proxy(object):
+    """A client of a Broker, with the interface of MCP2210 for transfers, settings, GPIO and the EEPROM.
+
+    Settings are shared by every client of an adapter. Clients that need different SPI settings
+    should use transfer_batch, which applies each transaction's settings as part of the request.
+    """
+
+    def __init__(self, path, key=None, priority=PRIORITY_NORMAL):
+        """Constructor.
+
+        Arguments:
+          path: The path of the broker's socket.
+          key: The key, such as the serial number, of the adapter to use. Defaults to the broker's first.
+          priority: The priority of this client's requests. Lower values run first.
+        """
+        self.priority = priority
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.key = self._call(OP_OPEN, (key or u'').encode('utf8')).decode('utf8')
+        self.gpio = _ProxyGPIO(self, 0)
+        self.gpio_direction = _ProxyGPIO(self, 1)
+        self.eeprom = _ProxyEEPROM(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _call(self, opcode, body=b''):
+        with self._lock:
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._sock.sendall(HEADER.pack(len(body), request_id, opcode, self.priority) + body)
+            header = _recv_exactly(self._sock, HEADER.size)
+            if header is None:
+                raise IOError("Connection to broker closed")
+            length, response_id, status, _ = HEADER.unpack(header)
+            response = _recv_exactly(self._sock, length)
+            if response is None:
+                raise IOError("Connection to broker closed")
+        if response_id != request_id:
+            raise BrokerError("Response to request %d received for request %d" % (response_id, request_id))
+        if status == STATUS_COMMAND_ERROR:
+            raise command_exception(bytearray(response)[0])
+        elif status == STATUS_VALUE_ERROR:
+            raise ValueError(response.decode('utf8'))
+        elif status != STATUS_OK:
+            raise BrokerError(response.decode('utf8'))
+        return response
+
+    def transfer(self, data):
+        """Transfers data over SPI, returning the data returned by the SPI device."""
+        return self._call(OP_TRANSFER, bytes(bytearray(data)))
+
+    def transfer_into(self, data, buffer):
+        """Transfers data over SPI, writing the data returned into a buffer. Returns the length."""
+        response = self.transfer(data)
+        memoryview(buffer)[:len(response)] = response
+        return len(response)
+
+    def transfer_batch(self, transactions, reorder=True):
+        """Runs a list of SPITransactions as a single request. See MCP2210.transfer_batch."""
+        transactions = [SPITransaction(*transaction) for transaction in transactions]
+        response = self._call(OP_TRANSFER_BATCH, _encode_batch(transactions, reorder))
+        results = []
+        offset = 0
+        for transaction in transactions:
+            results.append(response[offset:offset + len(transaction.data)])
+            offset += len(transaction.data)
+        return results
+
+    def cancel_transfer(self):
+        self._call(OP_CANCEL_TRANSFER)
+
+    def authenticate(self, password):
+        self._call(OP_AUTHENTICATE, password)
+
+    def read_event_count(self, reset=False):
+        return struct.unpack('<H', self._call(OP_EVENT_COUNT, b'\x01' if reset else b'\x00'))[0]
+
+    def close(self):
+        """Disconnects from the broker. The adapter stays open for other clients."""
+        self._sock.close()
+
+
+for _name, _prop in MCP2210.remote_properties():
+    setattr(MCP2210Proxy, _name, _proxy_property(_name, _prop.__doc__))
+
+
+def main(argv=None):
+    from mcp2210.pool import device_key, enumerate_devices
+    parser = argparse.ArgumentParser(description="Share MCP2210 adapters between processes.")
+    parser.add_argument('--socket', '-s', required=True, help="Path of the Unix domain socket to listen on.")
+    parser.add_argument('--vid', type=lambda value: int(value, 0), default=0x04D8, help="USB vendor ID.")
+    parser.add_argument('--pid', type=lambda value: int(value, 0), default=0x00DE, help="USB product ID.")
+    parser.add_argument('keys', nargs='*', help="Serial numbers or paths of the adapters to serve (default: all).")
+    args = parser.parse_args(argv)
+
+    devices = OrderedDict()
+    for info in enumerate_devices(args.vid, args.pid):
+        key = device_key(info)
+        if isinstance(key, bytes):
+            key = key.decode('utf8')
+        if not args.keys or key in args.keys:
+            devices[key] = MCP2210(args.vid, args.pid, serial_number=info.get('serial_number') or None,
+                                   path=info['path'], lazy=True)
+    if not devices:
+        parser.error("No adapters found")
+    broker = Broker(args.socket, devices)
+    print("Serving %s on %s" % (', '.join(devices), args.socket))
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.close()
+        for device in devices.values():
+            device.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""Recording, replay and decoding of the HID traffic between the host and an MCP2210.
+
+Captures are append-only binary files: a fixed header followed by fixed-size records, one for every
+report written to or read from the device. Because every record is the same size, captures are
+memory-mapped rather than loaded, and records are found by index or timestamp without scanning.
+
+Usage:
+    >>> dev = MCP2210(my_vid, my_pid, hid_device=HIDRecorder(hid.device(), 'rig.capture'))
+    >>> dev.transfer(b"data")
+    >>> dev.close()
+    >>> for message in decode(Capture('rig.capture')):
+    ...     print(message.record.timestamp, message.command_class.__name__)
+
+    >>> dev = MCP2210(my_vid, my_pid, hid_device=ReplayHID(Capture('rig.capture')))
+    >>> dev.transfer(b"data")  # Answered from the capture
+"""
+from collections import namedtuple
+import mmap
+import struct
+import threading
+import time
+from mcp2210 import commands
+from mcp2210.device import REPORT_SIZE, _clock
+
+
+MAGIC = b'MCP2210C'
+VERSION = 1
+
+# Magic, version, record size and the wall clock time the capture started.
+HEADER = struct.Struct('<8sHHd12x')
+# Seconds since the capture started, direction, report length and the report, padded to REPORT_SIZE.
+RECORD = struct.Struct('<dBB6x%ds' % REPORT_SIZE)
+
+OUT = 0  # Host to device
+IN = 1   # Device to host
+
+
+class CaptureError(Exception):
+    """Thrown when a file is not a capture, or replayed traffic does not match the capture."""
+
+
+_Record = namedtuple('Record', ['timestamp', 'direction', 'data'])
+
+
+class Record(_Record):
+    """A report captured going to or coming from the device.
+
+    Attributes:
+      timestamp: Monotonic time in seconds since the capture started.
+      direction: OUT for reports written to the device, IN for reports read from it.
+      data: The report, as bytes. Empty if a read returned nothing.
+    """
+
+    __slots__ = ()
+
+
+class CaptureWriter(object):
+    """Appends records to a capture file, writing the header first if the file is new.
+
+    A record cut short by a crash while recording is dropped before anything is appended.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'ab')
+        self._started = _clock()
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time()))
+            return
+        # Timestamps carry on from the last record, so they stay in order across sessions.
+        with open(path, 'rb') as f:
+            _read_header(f.read(HEADER.size))
+            length = (self._file.tell() - HEADER.size) // RECORD.size
+            self._file.truncate(HEADER.size + length * RECORD.size)
+            if length:
+                f.seek(HEADER.size + (length - 1) * RECORD.size)
+                self._started -= RECORD.unpack(f.read(RECORD.size))[0]
+
+    def write(self, direction, data):
+        data = bytes(bytearray(data))
+        self._file.write(RECORD.pack(_clock() - self._started, direction, len(data), data))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _read_header(data):
+    if len(data) < HEADER.size:
+        raise CaptureError("File is too short to be a capture")
+    magic, version, record_size, started = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CaptureError("Not an MCP2210 capture")
+    if version != VERSION or record_size != RECORD.size:
+        raise CaptureError("Unsupported capture version %d" % version)
+    return started
+
+
+class HIDRecorder(object):
+    """Wraps a hidapi device, recording every report written to and read from it.
+
+    Pass it to MCP2210 as hid_device, so the capture starts with the commands sent when the device
+    is opened and can be replayed from the start. Anything not recorded is passed straight through.
+    """
+
+    def __init__(self, hid_device, path):
+        """Constructor.
+
+        Arguments:
+          hid_device: The hidapi device to wrap.
+          path: The capture file to append records to.
+        """
+        self.hid = hid_device
+        self.writer = CaptureWriter(path)
+        # Pipelined transfers read from a background thread while the caller writes.
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.hid, name)
+
+    def write(self, data):
+        with self._lock:
+            self.writer.write(OUT, data)
+        return self.hid.write(data)
+
+    def read(self, max_length, timeout_ms=0):
+        data = self.hid.read(max_length, timeout_ms)
+        with self._lock:
+            self.writer.write(IN, data)
+        return data
+
+    def close(self):
+        """Closes the device and the capture file."""
+        self.hid.close()
+        with self._lock:
+            self.writer.close()
+
+
+class Capture(object):
+    """A memory-mapped capture file, indexable as a sequence of Records.
+
+    Attributes:
+      started: The wall clock time the capture started, in seconds since the epoch.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.started = _read_header(f.read(HEADER.size))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A record cut short by a crash while recording is ignored.
+        self._length = (len(self._map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Record index out of range")
+        timestamp, direction, length, data = RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+        return Record(timestamp, direction, data[:length])
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self[i]
+
+    def timestamp(self, index):
+        """Returns the timestamp of a record without unpacking the rest of it."""
+        return struct.unpack_from('<d', self._map, HEADER.size + index * RECORD.size)[0]
+
+    def find(self, timestamp):
+        """Returns the index of the first record at or after timestamp, found by bisection."""
+        low, high = 0, self._length
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class ReplayHID(object):
+    """A stand-in for a hidapi device that answers from a capture.
+
+    Every report written must match the next report written in the capture, and reads return the
+    reports read in the capture, in order. This makes replays deterministic: the same code against
+    the same capture always gets the same responses, or fails at the first point it diverges.
+    Captures of pipelined transfers cannot be replayed, since their reads and writes interleave
+    differently from one run to the next.
+    """
+
+    def __init__(self, capture, start=0, timing=False, strict=True):
+        """Constructor.
+
+        Arguments:
+          capture: A Capture.
+          start: The index of the first record to replay.
+          timing: If True, reads are delayed to reproduce the timing of the capture.
+          strict: If False, written reports are not checked against the capture.
+        """
+        self.capture = capture
+        self.position = start
+        self.timing = timing
+        self.strict = strict
+        self._offset = None
+
+    def open(self, vid, pid, serial_number=None):
+        pass
+
+    def open_path(self, path):
+        pass
+
+    def set_nonblocking(self, nonblocking):
+        pass
+
+    def close(self):
+        pass
+
+    def _next(self, direction):
+        if self.position >= len(self.capture):
+            raise CaptureError("Replay ran past the end of the capture")
+        record = self.capture[self.position]
+        if record.direction != direction:
+            raise CaptureError("Record %d is not a %s" % (self.position, 'write' if direction == OUT else 'read'))
+        self.position += 1
+        return record
+
+    def write(self, data):
+        record = self._next(OUT)
+        data = bytes(bytearray(data))
+        if self.strict and data != record.data:
+            raise CaptureError("Report written does not match record %d" % (self.position - 1))
+        return len(data)
+
+    def read(self, max_length, timeout_ms=0):
+        record = self._next(IN)
+        if self.timing:
+            now = _clock()
+            if self._offset is None:
+                self._offset = now - record.timestamp
+            delay = record.timestamp + self._offset - now
+            if delay > 0:
+                time.sleep(delay)
+        return list(bytearray(record.data[:max_length]))
+
+
+_Message = namedtuple('Message', ['record', 'command_class', 'message'])
+
+
+class Message(_Message):
+    """A captured record decoded with the classes in mcp2210.commands.
+
+    Attributes:
+      record: The Record.
+      command_class: The command class the report belongs to, or None if it is not recognised.
+      message: The report as an instance of the command class, or of its RESPONSE class for reads.
+        None if the report is not recognised.
+    """
+
+    __slots__ = ()
+
+
+def _command_classes():
+    """Returns dicts mapping (command, subcommand) and command codes to command classes."""
+    by_subcommand = {}
+    by_command = {}
+    for cls in vars(commands).values():
+        if not isinstance(cls, type) or not hasattr(cls, 'COMMAND') or not hasattr(cls, 'RESPONSE'):
+            continue
+        if not getattr(cls, '_fields_', None):
+            continue
+        if cls._fields_[0][0] == 'header':
+            if hasattr(cls, 'SUBCOMMAND'):
+                by_subcommand[(cls.COMMAND, cls.SUBCOMMAND)] = cls
+        else:
+            by_command[cls.COMMAND] = cls
+    return by_subcommand, by_command
+
+
+def command_class_for(report):
+    """Returns the command class for a report written to the device, or None if it is not recognised."""
+    report = bytearray(report)
+    if len(report) < 2:
+        return None
+    by_subcommand, by_command = _command_classes()
+    return by_subcommand.get((report[0], report[1])) or by_command.get(report[0])
+
+
+def decode(records):
+    """Decodes records, yielding a Message for each.
+
+    Reads are decoded using the response class of the command written before them.
+
+    Arguments:
+      records: An iterable of Records, such as a Capture.
+    """
+    by_subcommand, by_command = _command_classes()
+    command_class = None
+    for record in records:
+        data = bytearray(record.data)
+        if record.direction == OUT:
+            command_class = None
+            if len(data) >= 2:
+                command_class = by_subcommand.get((data[0], data[1])) or by_command.get(data[0])
+            cls = command_class
+        else:
+            cls = command_class.RESPONSE if command_class is not None else None
+        message = None
+        if cls is not None and data:
+            message = cls.from_buffer_copy(bytes(data.ljust(REPORT_SIZE, b'\0')))
+        yield Message(record, command_class if cls is not None else None, message)
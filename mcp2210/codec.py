@@ -0,0 +1,152 @@
+"""Precompiled wire codecs for MCP2210 commands and responses.
+
+Building a ctypes command, copying it into a report and copying the reply into a new ctypes response
+costs far more than the few bytes involved. A Codec works out a command's wire layout once, from the
+_fields_ of the command and response classes in mcp2210.commands. Encoding copies a prebuilt template
+into the report buffer and packs only the arguments given; decoding returns a ResponseView that reads
+fields straight out of the response buffer when they are accessed.
+
+Settings structures are still decoded into, and encoded from, the public ctypes types.
+"""
+from ctypes import Array, Structure, addressof, sizeof, string_at
+import struct
+
+
+class _Field(object):
+    """Reads and writes a single field of a wire layout."""
+
+    def __init__(self, name, offset, ctype):
+        self.name = name
+        self.offset = offset
+        self.ctype = ctype
+        self.size = sizeof(ctype)
+        if issubclass(ctype, Structure):
+            self.pack_into = self._pack_structure
+            self.unpack_from = self._unpack_structure
+        elif issubclass(ctype, Array):
+            self.pack_into = self._pack_bytes
+            self.unpack_from = self._unpack_bytes
+        else:
+            self._struct = struct.Struct('<' + ctype._type_)
+            self.pack_into = self._pack_scalar
+            self.unpack_from = self._unpack_scalar
+
+    def _pack_scalar(self, buffer, value):
+        self._struct.pack_into(buffer, self.offset, value)
+
+    def _unpack_scalar(self, buffer):
+        return self._struct.unpack_from(buffer, self.offset)[0]
+
+    def _pack_bytes(self, buffer, value):
+        if isinstance(value, Array):
+            value = string_at(addressof(value), sizeof(value))
+        data = memoryview(value)
+        if len(data) > self.size:
+            raise ValueError("%s is at most %d bytes long" % (self.name, self.size))
+        buffer[self.offset:self.offset + len(data)] = data
+
+    def _unpack_bytes(self, buffer):
+        return memoryview(buffer)[self.offset:self.offset + self.size]
+
+    def _pack_structure(self, buffer, value):
+        buffer[self.offset:self.offset + self.size] = string_at(addressof(value), self.size)
+
+    def _unpack_structure(self, buffer):
+        return self.ctype.from_buffer_copy(buffer, self.offset)
+
+
+def _layout(cls, base=0):
+    """Returns a list of _Fields for a structure class, with anonymous structures flattened."""
+    anonymous = getattr(cls, '_anonymous_', ())
+    fields = []
+    for name, ctype in cls._fields_:
+        offset = base + getattr(cls, name).offset
+        fields.append(_Field(name, offset, ctype))
+        if name in anonymous:
+            fields.extend(_layout(ctype, offset))
+    return fields
+
+
+class ResponseView(object):
+    """Base class for lazy views of a response.
+
+    Fields are read from the underlying buffer when accessed, so a view over a device's response
+    buffer is only valid until the next report is exchanged. Use copy() to keep one for longer.
+    """
+
+    __slots__ = ('_buffer',)
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def copy(self):
+        """Returns a view over a private copy of the response."""
+        return type(self)(bytes(self._buffer))
+
+
+def _field_property(field):
+    return property(lambda self: field.unpack_from(self._buffer))
+
+
+def _view_class(response_class):
+    """Builds a ResponseView subclass with the fields and properties of a ctypes response class."""
+    namespace = {'__slots__': ()}
+    for field in _layout(response_class):
+        namespace[field.name] = _field_property(field)
+    for cls in reversed(response_class.__mro__):
+        for name, value in vars(cls).items():
+            if isinstance(value, property):
+                namespace[name] = value
+    return type(response_class.__name__ + 'View', (ResponseView,), namespace)
+
+
+class Codec(object):
+    """The precompiled wire layout of a command class and its response.
+
+    Attributes:
+      template: A report with the command's fixed bytes, such as its command code, filled in.
+      arguments: The fields that encode() fills in from its positional arguments, in order.
+      view_class: The ResponseView subclass used to decode responses.
+    """
+
+    def __init__(self, command_class, report_size=64):
+        self.command_class = command_class
+        fields = _layout(command_class)
+        self.template = bytearray(report_size)
+        names = [name for name, _ in command_class._fields_]
+        if 'header' in names:
+            header = dict((field.name, field) for field in _layout(command_class._fields_[0][1]))
+            header['command'].pack_into(self.template, command_class.COMMAND)
+            header['subcommand'].pack_into(self.template, command_class.SUBCOMMAND)
+            fixed = 'header'
+        else:
+            fields[0].pack_into(self.template, command_class.COMMAND)
+            fixed = 'command'
+        top_level = set(names)
+        self.arguments = [field for field in fields if field.name in top_level and field.name != fixed]
+        self.view_class = _view_class(command_class.RESPONSE)
+
+    def encode_into(self, report, *args):
+        """Fills report with the command, taking the values of its fields from args in order.
+
+        Fields not given are left as zero.
+        """
+        report[:] = self.template
+        for field, value in zip(self.arguments, args):
+            field.pack_into(report, value)
+
+    def decode(self, buffer):
+        """Returns a ResponseView over a response buffer."""
+        return self.view_class(buffer)
+
+
+_codecs = {}
+
+
+def codec_for(command_class):
+    """Returns the Codec for a command class, compiling it the first time it is asked for."""
+    try:
+        return _codecs[command_class]
+    except KeyError:
+        codec = _codecs[command_class] = Codec(command_class)
+        return codec
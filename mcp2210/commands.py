@@ -1,4 +1,22 @@
-from ctypes import Structure, c_ubyte, c_ushort, c_uint, c_char
+from ctypes import Array, Structure, c_ubyte, c_ushort, c_uint, c_char, memmove, string_at, addressof
+
+
+# Status codes returned in the second byte of every response.
+STATUS_SUCCESS = 0x00
+STATUS_SPI_BUS_UNAVAILABLE = 0xF7
+STATUS_TRANSFER_IN_PROGRESS = 0xF8
+STATUS_EEPROM_WRITE_FAILED = 0xFA
+STATUS_ACCESS_BLOCKED = 0xFB
+STATUS_PASSWORD_REJECTED = 0xFC
+STATUS_ACCESS_DENIED = 0xFD
+
+# SPI engine states reported in SPITransferResponse.engine_status.
+ENGINE_FINISHED = 0x10
+ENGINE_STARTED = 0x20
+ENGINE_DATA_PENDING = 0x30
+
+# Delays in SPISettings are expressed in units of 100us.
+DELAY_UNIT = 100e-6
 
 
 class CommandHeader(Structure):
@@ -29,12 +47,39 @@ class Command(Structure):
         super(Command, self).__init__((self.COMMAND, self.SUBCOMMAND, 0x00, 0x00), *args, **kwargs)
 
 
+class Settings(Structure):
+    """Base class for settings structures, which compare field by field."""
+
+    def _field(self, name):
+        value = getattr(self, name)
+        if isinstance(value, Array):
+            return list(value)
+        return value
+
+    def diff(self, other):
+        """Returns the names of the fields that differ between this and another settings structure."""
+        return [name for name, _ in self._fields_ if self._field(name) != other._field(name)]
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return not self.diff(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+
 class SetBootSettingsCommand(Command):
     COMMAND = 0x60
     RESPONSE = EmptyResponse
 
 
-class ChipSettings(Structure):
+class ChipSettings(Settings):
     _fields_ = [('pin_designations', c_ubyte * 9),
                 ('gpio_outputs', c_ushort),
                 ('gpio_directions', c_ushort),
@@ -49,7 +94,7 @@ class SetBootChipSettingsCommand(SetBootSettingsCommand):
                 ('settings', ChipSettings)]
 
 
-class SPISettings(Structure):
+class SPISettings(Settings):
     _fields_ = [('bit_rate', c_uint),
                 ('idle_cs', c_ushort),
                 ('active_cs', c_ushort),
@@ -59,6 +104,23 @@ class SPISettings(Structure):
                 ('spi_tx_size', c_ushort),
                 ('spi_mode', c_ubyte)]
 
+    def transfer_time(self, length, start=True, end=True):
+        """Returns the minimum time in seconds the SPI engine needs to clock out some bytes.
+
+        Arguments:
+          length: The number of bytes to clock.
+          start: If true, include the chip select to first data byte delay.
+          end: If true, include the last data byte to chip select delay.
+        """
+        if length <= 0 or self.bit_rate == 0:
+            return 0.0
+        delays = (length - 1) * self.interbyte_delay
+        if start:
+            delays += self.cs_data_delay
+        if end:
+            delays += self.lb_cs_delay
+        return length * 8.0 / self.bit_rate + delays * DELAY_UNIT
+
 
 class SetBootSPISettingsCommand(SetBootSettingsCommand):
     SUBCOMMAND = 0x10
@@ -66,7 +128,7 @@ class SetBootSPISettingsCommand(SetBootSettingsCommand):
                 ('settings', SPISettings)]
 
 
-class USBSettings(Structure):
+class USBSettings(Settings):
     _fields_ = [('vid', c_ushort),
                 ('pid', c_ushort),
                 ('power_option', c_ubyte),
@@ -92,12 +154,12 @@ class SetUSBStringCommand(SetBootSettingsCommand):
 
     @property
     def string(self):
-        return ''.join(chr(x) for x in self.str[:self.str_len - 2]).decode('utf16')
+        return string_at(addressof(self.str), max(self.str_len - 2, 0)).decode('utf16')
 
     @string.setter
     def string(self, value):
-        for i, x in enumerate((value + '\0').encode('utf16')):
-            self.str[i] = ord(x)
+        data = (value + u'\0').encode('utf16')
+        memmove(self.str, data, len(data))
         self.str_len = len(value) * 2 + 4
 
 
@@ -167,7 +229,7 @@ class GetUSBStringResponse(Response):
 
     @property
     def string(self):
-        return ''.join(chr(x) for x in self.str[:self.str_len - 2]).decode('utf16')
+        return bytes(bytearray(self.str[:max(self.str_len - 2, 0)])).decode('utf16')
 
 
 class GetUSBProductCommand(GetBootSettingsCommand):
@@ -296,7 +358,7 @@ class SPITransferResponse(Structure):
 
     @property
     def data(self):
-        return ''.join(chr(x) for x in self._data[:self.length])
+        return bytes(bytearray(self._data[:self.length]))
 
 
 class SPITransferCommand(Structure):
@@ -308,8 +370,11 @@ class SPITransferCommand(Structure):
                 ('data', SPIBuffer)]
 
     def __init__(self, data):
-        data = SPIBuffer(*(ord(x) for x in data))
-        super(SPITransferCommand, self).__init__(self.COMMAND, len(data), 0x0000, data)
+        data = memoryview(data).tobytes()
+        if len(data) > len(SPIBuffer()):
+            raise ValueError("At most %d bytes can be sent in one report" % len(SPIBuffer()))
+        super(SPITransferCommand, self).__init__(self.COMMAND, len(data), 0x0000)
+        memmove(self.data, data, len(data))
 
 
 class DeviceStatusResponse(Response):
@@ -326,3 +391,20 @@ class CancelTransferCommand(Command):
     SUBCOMMAND = 0x00
     RESPONSE = DeviceStatusResponse
     _fields_ = [('header', CommandHeader)]
+
+
+class EventCountResponse(Response):
+    _anonymous_ = ['header']
+    _fields_ = [('header', ResponseHeader),
+                ('count', c_ushort)]
+
+
+class GetEventCountCommand(Command):
+    COMMAND = 0x12
+    SUBCOMMAND = 0xFF  # Any value other than 0x00 leaves the counter running
+    RESPONSE = EventCountResponse
+    _fields_ = [('header', CommandHeader)]
+
+
+class ResetEventCountCommand(GetEventCountCommand):
+    SUBCOMMAND = 0x00  # Clears the counter once it has been read
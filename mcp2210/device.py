@@ -1,88 +1,835 @@
+from collections import deque, namedtuple, OrderedDict
+from contextlib import closing, contextmanager
+from ctypes import Structure, addressof, c_ubyte, memmove, memset, sizeof, string_at
 import hid
 from mcp2210 import commands
+from mcp2210.codec import codec_for
+import threading
 import time
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+REPORT_SIZE = 64
+MAX_TRANSACTION_SIZE = 0xFFFF  # SPISettings.spi_tx_size is 16 bits wide
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
 
 class CommandException(Exception):
-    """Thrown when the MCP2210 returns an error status code."""
+    """Thrown when the MCP2210 returns an error status code.
+
+    Known status codes are thrown as the subclasses below; command_exception() creates the right one
+    for a code.
+
+    Attributes:
+      code: The status code.
+      transient: True if the condition clears by itself, so the command can be sent again.
+    """
+
+    transient = False
 
     def __init__(self, code):
         super(CommandException, self).__init__("Got error code from device: 0x%.2x" % code)
+        self.code = code
+
+
+class SPIBusUnavailable(CommandException):
+    """Thrown when an external SPI master holds the bus."""
+
+    transient = True
+
+
+class TransferInProgress(CommandException):
+    """Thrown when the SPI engine is still busy with an earlier transfer."""
+
+    transient = True
+
+
+class EEPROMWriteFailed(CommandException):
+    """Thrown when a write to the EEPROM fails."""
+
+
+class AccessBlocked(CommandException):
+    """Thrown when a write is blocked because the settings are locked."""
+
+
+class PasswordRejected(CommandException):
+    """Thrown when the password sent does not match."""
+
+
+class AccessDenied(CommandException):
+    """Thrown when access is denied because too many wrong passwords have been sent."""
+
+
+_EXCEPTIONS = {
+    commands.STATUS_SPI_BUS_UNAVAILABLE: SPIBusUnavailable,
+    commands.STATUS_TRANSFER_IN_PROGRESS: TransferInProgress,
+    commands.STATUS_EEPROM_WRITE_FAILED: EEPROMWriteFailed,
+    commands.STATUS_ACCESS_BLOCKED: AccessBlocked,
+    commands.STATUS_PASSWORD_REJECTED: PasswordRejected,
+    commands.STATUS_ACCESS_DENIED: AccessDenied,
+}
+
+TRANSIENT_CODES = frozenset(code for code, cls in _EXCEPTIONS.items() if cls.transient)
+
+
+def command_exception(code):
+    """Returns a CommandException, of the subclass for the code if there is one, for a status code."""
+    return _EXCEPTIONS.get(code, CommandException)(code)
+
+
+class RetryPolicy(object):
+    """Decides whether, and after how long, to resend a report the device rejected.
+
+    The delay grows exponentially from initial_delay up to max_delay. When the time the device needs
+    is known, such as the time the SPI engine takes to clock out a report, no delay is shorter than it.
+
+    Attributes:
+      attempts: The most times a single report is resent.
+      initial_delay: The delay in seconds before the first retry.
+      max_delay: The longest delay in seconds between retries, unless the device needs longer.
+      backoff: The factor the delay grows by with each retry.
+      codes: The status codes that are retried.
+    """
+
+    def __init__(self, attempts=8, initial_delay=0.0005, max_delay=0.05, backoff=2.0, codes=TRANSIENT_CODES):
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.codes = frozenset(codes)
+
+    def delay(self, code, attempt, needed=None):
+        """Returns the time in seconds to wait before a retry, or None if the report should not be retried.
+
+        Arguments:
+          code: The status code the report was rejected with.
+          attempt: The number of the retry, starting at 1.
+          needed: The time in seconds the device is known to need before it can accept the report.
+        """
+        if code not in self.codes or attempt > self.attempts:
+            return None
+        return max(needed or 0.0, min(self.initial_delay * self.backoff ** (attempt - 1), self.max_delay))
+
+
+class RetryStats(object):
+    """Counts reports that were rejected with transient status codes and resent.
+
+    Attributes:
+      retries: A dict mapping status codes to the number of times a report was resent after them.
+      recoveries: The number of reports accepted after being resent.
+      failures: The number of reports given up on after being resent.
+      waited: Total time in seconds spent waiting before resending.
+    """
+
+    def __init__(self):
+        self.retries = {}
+        self.recoveries = 0
+        self.failures = 0
+        self.waited = 0.0
+
+    def _retry(self, code, delay):
+        self.retries[code] = self.retries.get(code, 0) + 1
+        self.waited += delay
+
+    def __repr__(self):
+        return "<RetryStats retries=%d recoveries=%d failures=%d waited=%.6f>" % (
+            sum(self.retries.values()), self.recoveries, self.failures, self.waited)
+
+
+class ReconnectPolicy(object):
+    """Decides how long to wait between attempts to reopen a device that has gone away.
+
+    Attributes:
+      attempts: The most times to try opening the device again before giving up.
+      initial_delay: The delay in seconds before the second attempt.
+      max_delay: The longest delay in seconds between attempts.
+      backoff: The factor the delay grows by with each attempt.
+    """
+
+    def __init__(self, attempts=10, initial_delay=0.05, max_delay=2.0, backoff=2.0):
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+
+    def delay(self, attempt):
+        """Returns the time in seconds to wait after a failed attempt, or None to give up.
+
+        Arguments:
+          attempt: The number of the attempt that failed, starting at 1.
+        """
+        if attempt >= self.attempts:
+            return None
+        return min(self.initial_delay * self.backoff ** (attempt - 1), self.max_delay)
+
+
+class DeviceDisconnected(IOError):
+    """Thrown when the HID device goes away, or cannot be opened."""
+
+
+class TransferCancelled(Exception):
+    """Thrown when an SPI transfer is abandoned because abort() was called."""
+
+
+class TransferStats(object):
+    """Describes how an SPI transfer used the USB link.
+
+    Attributes:
+      length: The number of bytes transferred.
+      reports: The number of SPI transfer reports exchanged with the device.
+      polls: The number of reports that neither sent nor received any data.
+      waited: Time in seconds spent sleeping while the SPI engine was busy.
+      elapsed: Total time in seconds the transfer took.
+      depth: The most reports that were in flight at once.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.reports = 0
+        self.polls = 0
+        self.waited = 0.0
+        self.elapsed = 0.0
+        self.depth = 1
+
+    @property
+    def reports_per_second(self):
+        """The rate at which reports were exchanged with the device."""
+        if not self.elapsed:
+            return 0.0
+        return self.reports / self.elapsed
+
+    @property
+    def throughput(self):
+        """The achieved transfer rate in bytes per second."""
+        if not self.elapsed:
+            return 0.0
+        return self.length / self.elapsed
+
+    def __repr__(self):
+        return "<TransferStats length=%d reports=%d polls=%d elapsed=%.6f>" % (
+            self.length, self.reports, self.polls, self.elapsed)
+
+
+_SPITransaction = namedtuple('SPITransaction', ['chip_select', 'spi_mode', 'bit_rate', 'data'])
+
+
+class SPITransaction(_SPITransaction):
+    """A single SPI transaction for MCP2210.transfer_batch.
+
+    Attributes:
+      chip_select: Bitmask of the chip select pins to toggle from their idle state for the transaction.
+      spi_mode: The SPI mode (0-3) to use.
+      bit_rate: The SPI bit rate to use, in bits per second.
+      data: The data to transfer.
+    """
+
+    __slots__ = ()
+
+
+class BatchStats(object):
+    """Describes the settings traffic of a batch of SPI transactions.
+
+    Attributes:
+      transactions: The number of transactions in the batch.
+      settings_writes: The number of SPI settings commands sent before transactions.
+      settings_saved: The number of settings commands saved compared with writing the settings
+        before every transaction.
+      restored: True if the transfer settings were written back to the device after the batch.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.settings_writes = 0
+        self.restored = False
+
+    @property
+    def settings_saved(self):
+        return self.transactions - self.settings_writes
+
+    def __repr__(self):
+        return "<BatchStats transactions=%d settings_writes=%d settings_saved=%d>" % (
+            self.transactions, self.settings_writes, self.settings_saved)
+
+
+class _StreamReader(object):
+    """Reads data in pieces from a bytes-like object, a file-like object or an iterable of chunks."""
+
+    def __init__(self, source):
+        self._position = 0
+        if hasattr(source, 'read'):
+            self._next = source.read
+        else:
+            self._next = self._next_from_chunks
+            try:
+                self._chunk = memoryview(source)
+                self._chunks = iter(())
+            except TypeError:
+                self._chunk = memoryview(b'')
+                self._chunks = iter(source)
+
+    def _next_from_chunks(self, count):
+        while self._position >= len(self._chunk):
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return b''
+            self._position = 0
+        piece = self._chunk[self._position:self._position + count]
+        self._position += len(piece)
+        return piece
+
+    def read(self, count):
+        """Returns the next count bytes, or fewer if the source is exhausted."""
+        piece = self._next(count)
+        if len(piece) == count or not piece:
+            return piece
+        data = bytearray(piece)
+        while len(data) < count:
+            piece = self._next(count - len(data))
+            if not piece:
+                break
+            data += piece
+        return data
+
+    def readinto(self, buffer):
+        """Fills a writable buffer from the source, returning the number of bytes read."""
+        filled = 0
+        while filled < len(buffer):
+            piece = self._next(len(buffer) - filled)
+            if not piece:
+                break
+            buffer[filled:filled + len(piece)] = piece
+            filled += len(piece)
+        return filled
+
+
+# GPIO cache policies.
+CACHE_WRITE_THROUGH = 'write-through'  # Read once, then served from the cache.
+CACHE_TTL = 'ttl'  # Read again once the cached value is older than the ttl.
+CACHE_FRESH_INPUTS = 'fresh-inputs'  # Reads involving input pins always go to the device.
+
+ALL_GPIO_PINS = 0x1FF
+
+GPIOState = namedtuple('GPIOState', ['direction', 'value'])
 
 
 class GPIOSettings(object):
-    """Encapsulates settings for GPIO pins - direction or status."""
+    """Encapsulates settings for GPIO pins - direction or status.
+
+    Writes are always sent to the device straight away, unless made inside a `batch()` block, in which
+    case they are combined into a single command when the block exits. How reads use the cached value
+    is controlled by `policy`, one of CACHE_WRITE_THROUGH, CACHE_TTL (with `ttl` in seconds) or
+    CACHE_FRESH_INPUTS. MCP2210.gpio defaults to CACHE_FRESH_INPUTS, so input pins are always read
+    from the device, and MCP2210.gpio_direction to CACHE_WRITE_THROUGH.
+
+    Usage:
+        >>> dev.gpio.policy = CACHE_FRESH_INPUTS
+        >>> with dev.gpio.batch():
+        ...     dev.gpio[0] = 1
+        ...     dev.gpio[1] = 0
+    """
+
+    def __init__(self, device, get_command, set_command, direction=None, policy=CACHE_WRITE_THROUGH):
+        """Constructor.
 
-    def __init__(self, device, get_command, set_command):
+        Arguments:
+          device: The MCP2210 the settings belong to.
+          get_command: The command class that reads the settings.
+          set_command: The command class that writes the settings.
+          direction: The GPIOSettings holding pin directions, used by the CACHE_FRESH_INPUTS policy.
+          policy: The initial caching policy.
+        """
         self._device = device
         self._get_command = get_command
         self._set_command = set_command
+        self._direction = direction
         self._value = None
+        self._fetched = 0.0
+        self._pending = None
+        self._batching = 0
+        self.policy = policy
+        self.ttl = 0.0
 
-    @property
-    def raw(self):
+    def refresh(self):
+        """Reads the settings from the device, updating the cache, and returns them."""
+        self._value = self._device.send(self._get_command).gpio
+        self._fetched = _clock()
+        return self._value
+
+    def restore(self):
+        """Writes the cached settings back to the device, if there are any, without reading them first."""
+        if self._value is not None:
+            self._device.send(self._set_command, self._value)
+            self._fetched = _clock()
+
+    def invalidate(self):
+        """Discards the cached settings, so they are read from the device on next access."""
+        self._value = None
+
+    def _stale(self, pins):
+        if self._value is None:
+            return True
+        if self.policy == CACHE_TTL:
+            return _clock() - self._fetched > self.ttl
+        if self.policy == CACHE_FRESH_INPUTS and self._direction is not None:
+            return bool(self._direction.raw & pins)
+        return False
+
+    def _read(self, pins):
+        if self._pending is not None:
+            return self._pending
+        if self._stale(pins):
+            return self.refresh()
+        return self._value
+
+    def _base(self):
+        """Returns the value writes to individual pins are applied to."""
+        if self._pending is not None:
+            return self._pending
         if self._value is None:
-            self._value = self._device.sendCommand(self._get_command()).gpio
+            return self.refresh()
         return self._value
 
+    @property
+    def raw(self):
+        return self._read(ALL_GPIO_PINS)
+
     @raw.setter
     def raw(self, value):
-        self._value = value
-        self._device.sendCommand(self._set_command(value))
+        if self._batching:
+            self._pending = value
+        else:
+            self._device.send(self._set_command, value)
+            self._value = value
+            self._fetched = _clock()
 
     def __getitem__(self, i):
-        return (self.raw >> i) & 1
+        return (self._read(1 << i) >> i) & 1
 
     def __setitem__(self, i, value):
         if value:
-            self.raw |= 1 << i
+            self.raw = self._base() | (1 << i)
         else:
-            self.raw &= ~(1 << i)
+            self.raw = self._base() & ~(1 << i)
+
+    @contextmanager
+    def batch(self):
+        """Returns a context manager that combines writes into a single command sent on exit.
+
+        Nothing is sent if the staged value ends up the same as when the block started, and nothing
+        is sent if the block raises an exception.
+        """
+        outermost = not self._batching
+        if outermost:
+            start = self._pending = self._base()
+        self._batching += 1
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                self._pending = None
+            raise
+        finally:
+            self._batching -= 1
+        if outermost:
+            value, self._pending = self._pending, None
+            if value != start:
+                self.raw = value
 
 
-def remote_property(name, get_command, set_command, field_name, doc=None):
+def _snapshot(value):
+    """Returns an immutable copy of a property value, suitable for comparison with later values."""
+    if isinstance(value, Structure):
+        return string_at(addressof(value), sizeof(value))
+    return value
+
+
+def _copy(value):
+    """Returns a copy of a property value that can be modified without affecting the original."""
+    if isinstance(value, Structure):
+        return type(value).from_buffer_copy(value)
+    return value
+
+
+class RemoteProperty(property):
+    """A property whose value is read from, cached from and written to a remote device.
+
+    The value is read on first access and cached on the owning object. Alongside it, a snapshot of
+    the value last read from or written to the device is kept, so assigning a value the device already
+    holds does not send a set command. This also applies when a cached structure has been modified in
+    place and assigned back. If the owner's `settings_ttl` is not None, cached values older than that
+    many seconds are read again.
+
+    Attributes:
+      volatile: True if the value lives in the device's volatile memory and is lost on reset.
+      invalidates: Names of other caches on the owner, such as `gpio`, that writing the value changes
+        on the device and that are invalidated when it is written.
+    """
+
+    def __init__(self, name, get_command, set_command, field_name, doc=None, volatile=False, invalidates=()):
+        super(RemoteProperty, self).__init__(self._get, self._set, doc=doc)
+        self.name = name
+        self.get_command = get_command
+        self.set_command = set_command
+        self.field_name = field_name
+        self.volatile = volatile
+        self.invalidates = tuple(invalidates)
+        self._shadow_name = name + '_shadow'
+        self._fetched_name = name + '_fetched'
+
+    def _fresh(self, instance):
+        """Returns true if the instance has a cached value that has not expired."""
+        try:
+            fetched = getattr(instance, self._fetched_name)
+        except AttributeError:
+            return False
+        ttl = getattr(instance, 'settings_ttl', None)
+        return ttl is None or _clock() - fetched <= ttl
+
+    def _get(self, instance):
+        if not self._fresh(instance):
+            return self.fetch(instance)
+        return getattr(instance, self.name)
+
+    def _set(self, instance, value):
+        setattr(instance, self.name, value)
+        if self.is_current(instance, value):
+            return
+        try:
+            if isinstance(value, Structure):
+                instance.send(self.set_command, value)
+            else:
+                instance.sendCommand(self.set_command(value))
+        finally:
+            for name in self.invalidates:
+                getattr(instance, name).invalidate()
+        self._store(instance, value)
+
+    def _store(self, instance, value):
+        setattr(instance, self.name, value)
+        setattr(instance, self._shadow_name, _snapshot(value))
+        setattr(instance, self._fetched_name, _clock())
+
+    def fetch(self, instance):
+        """Reads the value from the device, caching and returning it."""
+        value = getattr(instance.send(self.get_command), self.field_name)
+        self._store(instance, value)
+        return value
+
+    def restore(self, instance):
+        """Writes the value the device last held back to it, if it is cached, without reading it first.
+
+        The cached value itself is left alone, so changes made to it in place are still sent when it
+        is next assigned.
+        """
+        try:
+            shadow = getattr(instance, self._shadow_name)
+        except AttributeError:
+            return
+        value = getattr(instance, self.name)
+        if isinstance(value, Structure):
+            instance.send(self.set_command, type(value).from_buffer_copy(shadow))
+        else:
+            instance.sendCommand(self.set_command(shadow))
+        setattr(instance, self._fetched_name, _clock())
+
+    def is_current(self, instance, value):
+        """Returns true if the device is known to hold value, so assigning it would send nothing."""
+        return self._fresh(instance) and getattr(instance, self._shadow_name) == _snapshot(value)
+
+    def invalidate(self, instance):
+        """Discards the cached value, so it is read from the device on next access."""
+        for name in (self.name, self._shadow_name, self._fetched_name):
+            instance.__dict__.pop(name, None)
+
+
+def remote_property(name, get_command, set_command, field_name, doc=None, volatile=False, invalidates=()):
     """Property decorator that facilitates writing properties for values from a remote device.
 
     Arguments:
       name: The field name to use on the local object to store the cached property.
-      get_command: A function that returns the remote value of the property.
-      set_command: A function that accepts a new value for the property and sets it remotely.
+      get_command: The command class that gets the remote value of the property.
+      set_command: The command class that accepts a new value for the property and sets it remotely.
       field_name: The name of the field to retrieve from the response message to get operations.
+      volatile: True if the value is lost when the device resets.
+      invalidates: Names of other caches on the local object that writing the property changes.
     """
+    return RemoteProperty(name, get_command, set_command, field_name, doc=doc, volatile=volatile,
+                          invalidates=invalidates)
 
-    def getter(self):
-        try:
-            return getattr(self, name)
-        except AttributeError:
-            value = getattr(self.sendCommand(get_command()), field_name)
-            setattr(self, name, value)
-            return value
 
-    def setter(self, value):
-        setattr(self, name, value)
-        self.sendCommand(set_command(value))
+class EEPROMVerifyError(Exception):
+    """Thrown when data read back from the EEPROM does not match the data written to it."""
 
-    return property(getter, setter, doc=doc)
+    def __init__(self, addresses):
+        super(EEPROMVerifyError, self).__init__(
+            "EEPROM verification failed at address(es) %s" % ', '.join('0x%.2x' % a for a in addresses))
+        self.addresses = addresses
 
 
 class EEPROMData(object):
-    """Represents data stored in the MCP2210 EEPROM."""
+    """Represents data stored in the MCP2210 EEPROM.
+
+    The whole EEPROM is read into a cached image the first time it is accessed, and reads are served
+    from the image afterwards. Writes only send the bytes that differ from the image. Within a
+    `staged()` block, writes are collected and flushed together when the block exits.
+
+    Usage:
+        >>> dev.eeprom[0:4]
+        b'\xff\xff\xff\xff'
+        >>> with dev.eeprom.staged(verify=True):
+        ...     dev.eeprom[0:64] = calibration_record
+    """
+
+    SIZE = 256
 
     def __init__(self, device):
         self._device = device
+        self._image = None
+        self._working = None
+        self._staging = 0
+
+    def load(self):
+        """Reads the entire EEPROM into the cached image, replacing anything already cached."""
+        image = bytearray(self.SIZE)
+        for address in range(self.SIZE):
+            image[address] = self._read(address)
+        self._image = image
+
+    def invalidate(self):
+        """Discards the cached image, so it is read from the device again on next access."""
+        self._image = None
+
+    def _read(self, address):
+        return self._device.send(commands.ReadEEPROMCommand, address).data
+
+    def _current(self):
+        """Returns the image reads should be served from, loading it if necessary."""
+        if self._working is not None:
+            return self._working
+        if self._image is None:
+            self.load()
+        return self._image
+
+    def __len__(self):
+        return self.SIZE
+
+    def _address(self, key):
+        if key < 0:
+            key += self.SIZE
+        if not 0 <= key < self.SIZE:
+            raise IndexError("EEPROM address out of range: %d" % key)
+        return key
 
     def __getitem__(self, key):
+        image = self._current()
         if isinstance(key, slice):
-            return ''.join(self[i] for i in range(*key.indices(255)))
+            return bytes(image[key])
         else:
-            return chr(self._device.sendCommand(commands.ReadEEPROMCommand(key)).header.reserved)
+            address = self._address(key)
+            return bytes(image[address:address + 1])
 
     def __setitem__(self, key, value):
         if isinstance(key, slice):
-            for i, j in enumerate(range(*key.indices(255))):
-                self[j] = value[i]
+            addresses = range(*key.indices(self.SIZE))
+            value = bytearray(value)
+            if len(value) != len(addresses):
+                raise ValueError("Expected %d bytes of data, got %d" % (len(addresses), len(value)))
         else:
-            self._device.sendCommand(commands.WriteEEPROMCommand(key, ord(value)))
+            addresses = [self._address(key)]
+            value = bytearray([value]) if isinstance(value, int) else bytearray(value)
+            if len(value) != 1:
+                raise ValueError("Expected a single byte, got %d" % len(value))
+
+        with self.staged():
+            for address, byte in zip(addresses, value):
+                self._working[address] = byte
+
+    @property
+    def dirty(self):
+        """A list of the addresses with staged writes that differ from the device's contents."""
+        if self._working is None:
+            return []
+        return [a for a in range(self.SIZE) if self._working[a] != self._image[a]]
+
+    @contextmanager
+    def staged(self, verify=False):
+        """Returns a context manager that collects writes and flushes them together on exit.
+
+        If the block raises an exception, the staged writes are discarded instead.
+
+        Arguments:
+            verify: If true, read back every byte written and raise EEPROMVerifyError on mismatch.
+        """
+        if not self._staging:
+            if self._image is None:
+                self.load()
+            self._working = bytearray(self._image)
+        self._staging += 1
+        try:
+            yield self
+        except BaseException:
+            self._staging -= 1
+            if not self._staging:
+                self._working = None
+            raise
+        self._staging -= 1
+        if not self._staging:
+            try:
+                self.flush(verify)
+            finally:
+                self._working = None
+
+    def flush(self, verify=False):
+        """Writes staged bytes that differ from the device's contents to the EEPROM.
+
+        Arguments:
+            verify: If true, read back every byte written and raise EEPROMVerifyError on mismatch.
+
+        Returns:
+            The number of bytes written.
+        """
+        dirty = self.dirty
+        for address in dirty:
+            self._device.send(commands.WriteEEPROMCommand, address, self._working[address])
+            self._image[address] = self._working[address]
+
+        if verify:
+            failed = []
+            for address in dirty:
+                actual = self._read(address)
+                if actual != self._working[address]:
+                    self._image[address] = actual
+                    failed.append(address)
+            if failed:
+                raise EEPROMVerifyError(failed)
+        return len(dirty)
+
+
+class _ResponseReader(object):
+    """Reads responses from a HID device on a thread of its own, for pipelined transfers.
+
+    Each call to expect() asks for one more response, which is read as soon as the device sends it and
+    handed back, in order, by get().
+    """
+
+    def __init__(self, hid_device):
+        self._hid = hid_device
+        self._requests = queue.Queue()
+        self._responses = queue.Queue()
+        self._outstanding = 0
+        self._thread = threading.Thread(target=self._run, name="mcp2210-reader")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while self._requests.get():
+            try:
+                data = self._hid.read(REPORT_SIZE)
+            except Exception as e:
+                data = e
+            self._responses.put((data, _clock()))
+
+    def expect(self):
+        self._outstanding += 1
+        self._requests.put(True)
+
+    def get(self, timeout=None):
+        """Returns the next response and the time it was read, or raises queue.Empty after timeout seconds."""
+        data, read = self._responses.get(timeout=timeout)
+        self._outstanding -= 1
+        if isinstance(data, Exception):
+            raise data
+        if not data:
+            raise IOError("No response from device")
+        return data, read
+
+    def drain(self, timeout):
+        """Reads and discards every response still expected.
+
+        Returns:
+            False if they had not all been read after timeout seconds, or if reading one failed.
+        """
+        deadline = _clock() + timeout
+        while self._outstanding:
+            try:
+                self.get(max(deadline - _clock(), 0.0))
+            except Exception:
+                return False
+        return True
+
+    def close(self):
+        self._requests.put(False)
+
+
+class FixedSizeTransfer(object):
+    """Runs back-to-back SPI transfers of a single, fixed size.
+
+    The transfer size is written to the device's transfer settings once, when the object is created,
+    and the settings are kept for every transfer after that, so each transfer costs only its SPI
+    reports. They are only written again if something else has changed the device's transfer settings
+    in the meantime. Received data is written into a buffer that is reused between transfers.
+
+    Used as a context manager, the transfer size the device had before is put back on exit.
+
+    Usage:
+        >>> with dev.fixed_size_transfer(8) as xfer:
+        ...     for i in range(1000):
+        ...         sample = xfer.transfer(b"\x00" * 8)
+    """
+
+    def __init__(self, device, length):
+        if length > MAX_TRANSACTION_SIZE:
+            raise ValueError("At most %d bytes can be sent in one transfer" % MAX_TRANSACTION_SIZE)
+        self._device = device
+        self.length = length
+        self._buffer = bytearray(length)
+        self._previous_length = device.transfer_settings.spi_tx_size
+        self._settings = _copy(device._prepare_transfer(length))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._device._prepare_transfer(self._previous_length)
+        return False
+
+    def transfer(self, data):
+        """Transfers data over SPI.
+
+        Arguments:
+            data: The data to transfer, which must be exactly `length` bytes long.
+
+        Returns:
+            The data returned by the SPI device.
+        """
+        self.transfer_into(data, self._buffer)
+        return bytes(self._buffer)
+
+    def transfer_into(self, data, buffer):
+        """Transfers data over SPI, writing the data returned by the SPI device into a buffer.
+
+        Arguments:
+            data: The data to transfer, which must be exactly `length` bytes long.
+            buffer: A writable buffer at least `length` bytes long.
+
+        Returns:
+            The number of bytes written to buffer.
+        """
+        if len(data) != self.length:
+            raise ValueError("Expected %d bytes of data, got %d" % (self.length, len(data)))
+        if len(buffer) < self.length:
+            raise ValueError("Buffer too small for a %d byte transfer" % self.length)
+        device = self._device
+        if not type(device).transfer_settings.is_current(device, self._settings):
+            device.transfer_settings = _copy(self._settings)
+        return device._transaction_into(memoryview(data), self._settings, memoryview(buffer))
 
 
 class MCP2210(object):
@@ -108,20 +855,136 @@ class MCP2210(object):
     See the MCP2210 datasheet (http://ww1.microchip.com/downloads/en/DeviceDoc/22288A.pdf) for full details
     on available commands and arguments.
     """
-    def __init__(self, vid, pid):
+    settings_ttl = None
+    # The most SPI transfer reports sent ahead of their responses; 1 runs transfers in lock step.
+    pipeline_depth = 1
+    # How long to wait, in seconds, for the responses still in flight when a pipelined transfer ends.
+    drain_timeout = 1.0
+
+    def __init__(self, vid, pid, serial_number=None, path=None, prefetch=False, hid_device=None, lazy=False):
         """Constructor.
 
         Arguments:
           vid: Vendor ID
           pid: Product ID
+          serial_number: If given, open the device with this USB serial number.
+          path: If given, open the device at this HID path instead, as returned by hid.enumerate().
+          prefetch: If true, read every setting into the cache straight away.
+          hid_device: An object with the same interface as hid.device to use instead of a real HID
+            device, such as a mcp2210.simulator.SimulatedMCP2210. It is opened with vid, pid and
+            serial_number or path, as a hid.device would be.
+          lazy: If true, the device is not opened until it is first used.
         """
-        self.hid = hid.device()
-        self.hid.open(vid, pid)
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+        self.path = path
+        self.connected = False
+        self.reconnect_policy = ReconnectPolicy()
+        self.reconnects = 0
+        self._hid = hid_device
+        self._owns_hid = hid_device is None
+        self._opened = False
+        self.hooks = []
+        self.retry_policy = RetryPolicy()
+        self.retry_stats = RetryStats()
+        # Every report goes out of and comes back into the same preallocated buffers.
+        self._report = bytearray(REPORT_SIZE)
+        self._report_data = (c_ubyte * REPORT_SIZE).from_buffer(self._report)
+        self._response = bytearray(REPORT_SIZE)
+        self._response_view = memoryview(self._response)
         self.gpio_direction = GPIOSettings(self, commands.GetGPIODirectionCommand, commands.SetGPIODirectionCommand)
-        self.gpio = GPIOSettings(self, commands.GetGPIOValueCommand, commands.SetGPIOValueCommand)
+        self.gpio = GPIOSettings(self, commands.GetGPIOValueCommand, commands.SetGPIOValueCommand,
+                                 direction=self.gpio_direction, policy=CACHE_FRESH_INPUTS)
         self.eeprom = EEPROMData(self)
+        self.last_transfer = None
+        self.last_batch = None
+        self._reader = None
+        self._abort_requested = False
+        if not lazy:
+            self.connect()
+        if prefetch:
+            self.prefetch_settings()
+
+    @property
+    def hid(self):
+        """The hidapi device, opened first if it is not already."""
+        if not self.connected:
+            self.connect()
+        return self._hid
+
+    def connect(self):
+        """Opens the device, if it is not already open.
+
+        A device that has been open before is looked for again by serial number, or by path if its
+        serial number is not known, retrying with backoff according to `reconnect_policy`. Once it is
+        open again, the cached volatile settings and GPIO state are written back to it without being
+        read first, since the device loses them when it is unplugged.
+
+        Raises DeviceDisconnected if the device cannot be opened.
+        """
+        if self.connected:
+            return
+        policy = self.reconnect_policy if self._opened else None
+        attempt = 0
+        while True:
+            try:
+                self._open()
+                if self._opened:
+                    self._restore_volatile()
+                break
+            except IOError as e:
+                self._close_hid()
+                attempt += 1
+                delay = policy.delay(attempt) if policy is not None else None
+                if delay is None:
+                    raise DeviceDisconnected("Could not open device: %s" % e)
+                time.sleep(delay)
+        if self._opened:
+            self.reconnects += 1
+        self._opened = True
+
+    def _open(self):
+        if self._owns_hid:
+            self._hid = hid.device()
+        if self._opened and self.serial_number:
+            self._hid.open(self.vid, self.pid, self.serial_number)
+        elif self.path is not None:
+            self._hid.open_path(self.path)
+        else:
+            self._hid.open(self.vid, self.pid, self.serial_number)
+        self.connected = True
+        if self.serial_number is None:
+            # Remembered so the same adapter can be found again, wherever it is plugged back in.
+            get_serial_number = getattr(self._hid, 'get_serial_number_string', None)
+            if get_serial_number is not None:
+                self.serial_number = get_serial_number() or None
         self.cancel_transfer()
 
+    def _restore_volatile(self):
+        """Writes cached volatile settings and GPIO state back to a device that has been reopened."""
+        for name, prop in self.remote_properties():
+            if prop.volatile:
+                prop.restore(self)
+        self.gpio_direction.restore()
+        self.gpio.restore()
+
+    def _close_hid(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self.connected:
+            self.connected = False
+            try:
+                self._hid.close()
+            except IOError:
+                pass
+
+    def _disconnected(self, error):
+        """Closes the device after an I/O error and raises DeviceDisconnected; it is reopened on next use."""
+        self._close_hid()
+        raise DeviceDisconnected("Lost connection to device: %s" % error)
+
     def sendCommand(self, command):
         """Sends a Command object to the MCP2210 and returns its response.
 
@@ -129,15 +992,107 @@ class MCP2210(object):
             A commands.Command instance
 
         Returns:
-            A commands.Response instance, or raises a CommandException on error.
+            A commands.Response instance, or raises a CommandException on error. Reports rejected
+            with a transient status are resent according to `retry_policy` first.
+        """
+        size = sizeof(command)
+        memmove(self._report_data, addressof(command), size)
+        memset(addressof(self._report_data) + size, 0, REPORT_SIZE - size)
+        self._exchange(type(command))
+        if self._response[1] != commands.STATUS_SUCCESS:
+            self._recover(type(command), self._response[1])
+        return command.RESPONSE.from_buffer_copy(self._response)
+
+    def send(self, command_class, *args):
+        """Sends a command using its precompiled codec, and returns a lazy view of the response.
+
+        Unlike sendCommand, no ctypes objects are built for the command or the response. The view reads
+        from the device's response buffer, so it is only valid until the next command is sent; use its
+        copy() method to keep it for longer.
+
+        Arguments:
+            command_class: A command class from mcp2210.commands.
+            args: Values for the command's fields after its header, in order.
+
+        Returns:
+            A codec.ResponseView, or raises a CommandException on error. Reports rejected with a
+            transient status are resent according to `retry_policy` first.
         """
-        command_data = [ord(x) for x in buffer(command)]
-        self.hid.write(command_data)
-        response_data = ''.join(chr(x) for x in self.hid.read(64))
-        response = command.RESPONSE.from_buffer_copy(response_data)
-        if response.status != 0:
-            raise CommandException(response.status)
-        return response
+        codec = codec_for(command_class)
+        codec.encode_into(self._report, *args)
+        self._exchange(command_class)
+        if self._response[1] != commands.STATUS_SUCCESS:
+            self._recover(command_class, self._response[1])
+        return codec.decode(self._response)
+
+    def _recover(self, command_class, status):
+        """Resends the outgoing report while the device rejects it with a status the retry policy retries.
+
+        Returns once the device accepts the report, or raises the CommandException for the status.
+        """
+        policy = self.retry_policy
+        attempt = 0
+        while status != commands.STATUS_SUCCESS:
+            attempt += 1
+            delay = policy.delay(status, attempt) if policy is not None else None
+            if delay is None:
+                if attempt > 1:
+                    self.retry_stats.failures += 1
+                raise command_exception(status)
+            self.retry_stats._retry(status, delay)
+            time.sleep(delay)
+            self._exchange(command_class)
+            status = self._response[1]
+        self.retry_stats.recoveries += 1
+
+    def _exchange(self, command_class):
+        """Writes the outgoing report buffer to the device and reads the reply into the response buffer.
+
+        Arguments:
+            command_class: The class of the command in the report, passed on to any hooks.
+        """
+        if not self.connected:
+            # Opening the device sends commands of its own through the report buffer.
+            report = bytes(self._report)
+            self.connect()
+            self._report[:] = report
+        if self.hooks:
+            return self._exchange_instrumented(command_class)
+        try:
+            self._hid.write(self._report)
+            data = self._hid.read(REPORT_SIZE)
+        except IOError as e:
+            self._disconnected(e)
+        if not data:
+            raise IOError("No response from device")
+        self._response[0:len(data)] = data
+
+    def _exchange_instrumented(self, command_class):
+        started = _clock()
+        try:
+            self._hid.write(self._report)
+            written = _clock()
+            data = self._hid.read(REPORT_SIZE)
+        except IOError as e:
+            self._disconnected(e)
+        read = _clock()
+        if not data:
+            raise IOError("No response from device")
+        self._response[0:len(data)] = data
+        for hook in self.hooks:
+            hook.command(command_class, self._report, self._response, written - started, read - written)
+
+    def add_hook(self, hook):
+        """Registers a hook to be told about every report exchanged with the device.
+
+        Arguments:
+            hook: An mcp2210.instrument.CommandHook, such as a CommandStats collector.
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Unregisters a hook added with add_hook."""
+        self.hooks.remove(hook)
 
     manufacturer_name = remote_property(
         '_manufacturer_name',
@@ -165,7 +1120,9 @@ class MCP2210(object):
         commands.GetChipSettingsCommand,
         commands.SetChipSettingsCommand,
         'settings',
-        doc="Sets and gets current chip settings such as GPIO assignments")
+        doc="Sets and gets current chip settings such as GPIO assignments",
+        volatile=True,
+        invalidates=('gpio_direction', 'gpio'))
 
     boot_transfer_settings = remote_property(
         '_boot_transfer_settings',
@@ -179,7 +1136,8 @@ class MCP2210(object):
         commands.GetSPISettingsCommand,
         commands.SetSPISettingsCommand,
         'settings',
-        doc="Sets and gets current transfer settings such as data rate")
+        doc="Sets and gets current transfer settings such as data rate",
+        volatile=True)
 
     boot_usb_settings = remote_property(
         '_boot_usb_settings',
@@ -188,37 +1146,553 @@ class MCP2210(object):
         'settings',
         doc="Sets and gets boot time USB settings such as VID and PID")
 
+    @classmethod
+    def remote_properties(cls):
+        """Returns a list of (name, RemoteProperty) pairs for every setting cached from the device."""
+        return [(name, getattr(cls, name)) for name in dir(cls) if isinstance(getattr(cls, name), RemoteProperty)]
+
+    def prefetch_settings(self, names=None):
+        """Reads settings from the device into the cache in a single pass.
+
+        Arguments:
+            names: The names of the settings to read. Defaults to every setting.
+        """
+        for name, prop in self.remote_properties():
+            if names is None or name in names:
+                prop.fetch(self)
+
+    def invalidate_settings(self, names=None):
+        """Discards cached settings, so they are read from the device on next access.
+
+        Call this after the device has been reset or changed by another program. Along with the
+        settings, the cached GPIO state and EEPROM image are discarded, as is the GPIO state cached
+        alongside any invalidated setting that changes it.
+
+        Arguments:
+            names: The names of the settings to invalidate, which may include 'gpio', 'gpio_direction'
+              and 'eeprom'. Defaults to everything.
+        """
+        caches = set()
+        for name, prop in self.remote_properties():
+            if names is None or name in names:
+                prop.invalidate(self)
+                caches.update(prop.invalidates)
+        for name in ('gpio_direction', 'gpio', 'eeprom'):
+            if names is None or name in names or name in caches:
+                getattr(self, name).invalidate()
+
+    def snapshot_settings(self, names=None):
+        """Returns a copy of the device's settings, for later use with restore_settings.
+
+        Arguments:
+            names: The names of the settings to include. Defaults to every setting.
+
+        Returns:
+            An OrderedDict mapping setting names to copies of their values.
+        """
+        return OrderedDict((name, _copy(getattr(self, name)))
+                           for name, prop in self.remote_properties() if names is None or name in names)
+
+    def restore_settings(self, snapshot):
+        """Writes settings saved by snapshot_settings back to the device.
+
+        Only settings that differ from what the device holds are written. Settings that are not
+        cached are read first to find out.
+
+        Returns:
+            A list of the names of the settings that were written.
+        """
+        written = []
+        for name, value in snapshot.items():
+            getattr(self, name)
+            if not getattr(type(self), name).is_current(self, value):
+                setattr(self, name, _copy(value))
+                written.append(name)
+        return written
+
+    def gpio_snapshot(self):
+        """Reads the direction and value of every GPIO pin from the device, refreshing both caches.
+
+        Returns:
+            A GPIOState(direction, value) of bitmasks. A direction bit of 1 means the pin is an input.
+        """
+        return GPIOState(self.gpio_direction.refresh(), self.gpio.refresh())
+
+    def read_event_count(self, reset=False):
+        """Reads the number of events counted on the GP6 interrupt pin.
+
+        GP6 must be designated as its dedicated function in chip_settings, and the edges counted are
+        chosen with the interrupt mode bits of other_settings. The counter is 16 bits wide and wraps.
+
+        Arguments:
+            reset: If True, the counter is cleared after it is read.
+
+        Returns:
+            The event count.
+        """
+        command = commands.ResetEventCountCommand if reset else commands.GetEventCountCommand
+        return self.send(command).count
+
     def authenticate(self, password):
         """Authenticates against a password-protected MCP2210.
 
         Arguments:
             password: The password to use.
         """
-        self.sendCommand(commands.SendPasswordCommand(password))
+        self.send(commands.SendPasswordCommand, password)
 
     def transfer(self, data):
         """Transfers data over SPI.
 
+        Rather than sleeping for a fixed time between reports, the transfer is paced by the time the
+        SPI engine needs to clock out each report at the current bit rate and delays, and by the
+        engine status the device returns. Statistics for the transfer are left in `last_transfer`.
+
         Arguments:
-            data: The data to transfer.
+            data: The data to transfer, as bytes, a bytearray or a memoryview.
 
         Returns:
             The data returned by the SPI device.
         """
+        response = bytearray(len(data))
+        self.transfer_into(data, response)
+        return bytes(response)
+
+    def transfer_into(self, data, buffer):
+        """Transfers data over SPI, writing the data returned by the SPI device into a buffer.
+
+        Arguments:
+            data: The data to transfer, as bytes, a bytearray or a memoryview.
+            buffer: A writable buffer such as a bytearray, at least as long as data.
+
+        Returns:
+            The number of bytes written to buffer.
+        """
+        data = memoryview(data)
+        length = len(data)
+        if length > MAX_TRANSACTION_SIZE:
+            raise ValueError("At most %d bytes can be sent in one transfer; use iter_transfer or "
+                             "transfer_stream for larger payloads" % MAX_TRANSACTION_SIZE)
+        if len(buffer) < length:
+            raise ValueError("Buffer too small for a %d byte transfer" % length)
+        buffer = memoryview(buffer)
+
+        settings = self._prepare_transfer(length)
+        return self._transaction_into(data, settings, buffer)
+
+    def iter_transfer(self, source, length=None, transaction_size=MAX_TRANSACTION_SIZE):
+        """Transfers a stream of data over SPI, yielding the data returned by the SPI device as it arrives.
+
+        Data is read from the source one report at a time, so memory use does not depend on the size
+        of the payload. Payloads longer than transaction_size are split into consecutive SPI
+        transactions, and chip select is released between them.
+
+        Arguments:
+            source: The data to transfer, as a bytes-like object, a file-like object with a read()
+              method, or an iterable of bytes-like chunks.
+            length: The number of bytes to transfer. If omitted, the source is read until it is
+              exhausted, buffering at most one transaction at a time.
+            transaction_size: The maximum number of bytes in each SPI transaction.
+
+        Yields:
+            Chunks of the data returned by the SPI device.
+        """
+        with closing(self._stream(source, length, transaction_size)) as chunks:
+            for chunk in chunks:
+                yield chunk.tobytes()
+
+    def transfer_stream(self, source, sink, length=None, transaction_size=MAX_TRANSACTION_SIZE):
+        """Transfers a stream of data over SPI, writing the data returned by the SPI device to a sink.
+
+        Arguments:
+            source: The data to transfer, as for iter_transfer.
+            sink: A file-like object with a write() method to receive the returned data.
+            length: The number of bytes to transfer, as for iter_transfer.
+            transaction_size: The maximum number of bytes in each SPI transaction.
+
+        Returns:
+            The number of bytes written to sink.
+        """
+        written = 0
+        with closing(self._stream(source, length, transaction_size)) as chunks:
+            for chunk in chunks:
+                sink.write(chunk)
+                written += len(chunk)
+        return written
+
+    def _stream(self, source, length, transaction_size):
+        """Runs as many SPI transactions as it takes to transfer source, yielding views of received data."""
+        if not 0 < transaction_size <= MAX_TRANSACTION_SIZE:
+            raise ValueError("transaction_size must be between 1 and %d" % MAX_TRANSACTION_SIZE)
+        reader = _StreamReader(source)
+        if length is None:
+            block = memoryview(bytearray(transaction_size))
+            while True:
+                count = reader.readinto(block)
+                if not count:
+                    return
+                settings = self._prepare_transfer(count)
+                with closing(self._spi_transaction(_StreamReader(block[:count]).read, count, settings)) as chunks:
+                    for chunk in chunks:
+                        yield chunk
+        else:
+            while length > 0:
+                count = min(length, transaction_size)
+                settings = self._prepare_transfer(count)
+                with closing(self._spi_transaction(reader.read, count, settings)) as chunks:
+                    for chunk in chunks:
+                        yield chunk
+                length -= count
+
+    def transfer_batch(self, transactions, reorder=True):
+        """Runs a list of SPI transactions, sending settings commands only when something changes.
+
+        Chip select, SPI mode, bit rate and transfer size are applied to the current transfer
+        settings for each transaction, and the settings are only written to the device when they
+        differ from the previous transaction. Once the batch has run, the transfer settings the
+        device had before are written back, if they differ. If the batch fails part way, the cached
+        transfer settings are discarded instead, so they are read from the device on next use.
+        Statistics for the batch are left in `last_batch`.
+
+        Arguments:
+            transactions: An iterable of SPITransaction instances or equivalent tuples.
+            reorder: If true, transactions are grouped by chip select, in order of each chip select's
+              first appearance, so that fewer settings changes are needed. Transactions on the same
+              chip select always run in the order given.
+
+        Returns:
+            A list of the data returned by the SPI device, in the same order as transactions.
+
+        Raises ValueError, before anything is sent, if any transaction is longer than
+        MAX_TRANSACTION_SIZE bytes.
+        """
+        transactions = [SPITransaction(*transaction) for transaction in transactions]
+        for i, transaction in enumerate(transactions):
+            if len(memoryview(transaction.data)) > MAX_TRANSACTION_SIZE:
+                raise ValueError("Transaction %d is longer than the %d bytes allowed in one transaction" %
+                                 (i, MAX_TRANSACTION_SIZE))
+        stats = BatchStats(len(transactions))
+        self.last_batch = stats
+
+        if reorder:
+            groups = OrderedDict()
+            for i, transaction in enumerate(transactions):
+                groups.setdefault(transaction.chip_select, []).append(i)
+            order = [i for group in groups.values() for i in group]
+        else:
+            order = range(len(transactions))
+
+        transfer_settings = type(self).transfer_settings
+        original = _copy(self.transfer_settings)
+        results = [None] * len(transactions)
+        try:
+            for i in order:
+                transaction = transactions[i]
+                data = memoryview(transaction.data)
+                settings = _copy(original)
+                settings.active_cs = settings.idle_cs ^ transaction.chip_select
+                settings.spi_mode = transaction.spi_mode
+                settings.bit_rate = transaction.bit_rate
+                settings.spi_tx_size = len(data)
+                if not transfer_settings.is_current(self, settings):
+                    stats.settings_writes += 1
+                    self.transfer_settings = settings
+
+                response = bytearray(len(data))
+                self._transaction_into(data, settings, memoryview(response))
+                results[i] = bytes(response)
+        except BaseException:
+            transfer_settings.invalidate(self)
+            raise
+        if not transfer_settings.is_current(self, original):
+            stats.restored = True
+            self.transfer_settings = original
+        return results
+
+    def fixed_size_transfer(self, length):
+        """Returns a FixedSizeTransfer for running many transfers of the same length.
+
+        Arguments:
+            length: The length of each transfer, in bytes.
+        """
+        return FixedSizeTransfer(self, length)
+
+    def _prepare_transfer(self, length):
+        """Makes sure the device's transfer size matches length, and returns the transfer settings.
+
+        A settings command is only sent if the transfer settings actually changed.
+        """
         settings = self.transfer_settings
-        settings.spi_tx_size = len(data)
+        settings.spi_tx_size = length
         self.transfer_settings = settings
+        return settings
+
+    def _transaction_into(self, data, settings, buffer):
+        """Runs a single SPI transaction, writing received data into a memoryview."""
+        if self.pipeline_depth > 1 and len(data):
+            return self._pipelined_transaction_into(data, settings, buffer)
+        received = 0
+        with closing(self._spi_transaction(_StreamReader(data).read, len(data), settings)) as chunks:
+            for chunk in chunks:
+                buffer[received:received + len(chunk)] = chunk
+                received += len(chunk)
+        return received
+
+    def _pipelined_transaction_into(self, data, settings, buffer):
+        """Runs a single SPI transaction with up to pipeline_depth reports in flight.
+
+        The device can reject any report, for instance while another master holds the bus, so a
+        report of data is only sent once the response to the one before it has been read, and is paced
+        from that response as it would be in lock step. Otherwise a later report could be accepted
+        after an earlier one was rejected, and the SPI device would see the data out of order. Reports
+        that only collect received data are sent ahead without waiting, while a reader thread collects
+        the responses. Responses come back in the order reports were sent, so each is matched to the
+        oldest report in flight.
+        """
+        hid_device = self.hid
+        if self._reader is None:
+            self._reader = _ResponseReader(hid_device)
+        reader = self._reader
+        length = len(data)
+        depth = self.pipeline_depth
+        policy = self.retry_policy
+        hooks = self.hooks
+        stats = TransferStats(length)
+        self.last_transfer = stats
+        started = ready = _clock()
+        report = bytearray(REPORT_SIZE)
+        report[0] = commands.SPITransferCommand.COMMAND
+        # (data length, data offset, report sent or None, write started, write finished) for each
+        # report in flight
+        in_flight = deque()
+        sent = received = rejected = 0
+        data_in_flight = False
+        done = False
+        try:
+            while not done:
+                if self._abort_requested:
+                    self._abort_requested = False
+                    raise TransferCancelled("Transfer aborted after %d of %d bytes" % (received, length))
 
-        response = ''
-        for i in range(0, len(data), 60):
-            response += self.sendCommand(commands.SPITransferCommand(data[i:i + 60])).data
-            time.sleep(0.01)
+                # Send as many reports as the pipeline allows. After a rejection, one report at a time
+                # is sent until the device accepts one.
+                limit = 1 if rejected else depth
+                while len(in_flight) < limit:
+                    if sent < length:
+                        if data_in_flight or _clock() < ready:
+                            break
+                        pending = min(length - sent, 60)
+                        report[4:4 + pending] = data[sent:sent + pending]
+                    elif len(in_flight) < (length - received + 59) // 60:
+                        pending = 0
+                    else:
+                        break
+                    report[1] = pending
+                    written = _clock()
+                    hid_device.write(report)
+                    reader.expect()
+                    in_flight.append((pending, sent, bytes(report) if hooks else None, written, _clock()))
+                    if pending:
+                        sent += pending
+                        data_in_flight = True
+                    stats.depth = max(stats.depth, len(in_flight))
 
-        while len(response) < len(data):
-            response += self.sendCommand(commands.SPITransferCommand('')).data
+                if not in_flight:
+                    delay = ready - _clock()
+                    if delay > 0:
+                        time.sleep(delay)
+                        stats.waited += delay
+                        for hook in hooks:
+                            hook.pacing(delay)
+                    continue
 
-        return ''.join(response)
+                # Wait for the next response, or until the engine can take more data.
+                timeout = None
+                if not data_in_flight and len(in_flight) < limit and sent < length:
+                    timeout = max(ready - _clock(), 0.0)
+                try:
+                    response, read = reader.get(timeout)
+                except queue.Empty:
+                    continue
+                pending, offset, sent_report, written, write_done = in_flight.popleft()
+                if pending:
+                    data_in_flight = False
+                stats.reports += 1
+                for hook in hooks:
+                    hook.command(commands.SPITransferCommand, sent_report, bytearray(response),
+                                 write_done - written, read - write_done)
+
+                status = response[1]
+                if status != commands.STATUS_SUCCESS:
+                    # The report was rejected without its data being taken, and nothing after it
+                    # carries data, so the transfer resumes from it.
+                    rejected += 1
+                    if pending:
+                        sent = offset
+                    if status == commands.STATUS_TRANSFER_IN_PROGRESS:
+                        stats.polls += 1
+                    needed = settings.transfer_time(60) if status == commands.STATUS_TRANSFER_IN_PROGRESS else None
+                    if policy is not None:
+                        delay = policy.delay(status, rejected, needed)
+                    else:
+                        delay = 0.0 if status == commands.STATUS_TRANSFER_IN_PROGRESS else None
+                    if delay is None:
+                        if rejected > 1:
+                            self.retry_stats.failures += 1
+                        raise command_exception(status)
+                    if policy is not None:
+                        self.retry_stats._retry(status, delay)
+                    ready = max(ready, _clock() + delay)
+                    continue
+                if rejected:
+                    self.retry_stats.recoveries += 1
+                    rejected = 0
+
+                if pending:
+                    ready = read + settings.transfer_time(pending, start=(offset == 0),
+                                                          end=(offset + pending == length))
+                count = response[2]
+                if count:
+                    buffer[received:received + count] = bytearray(response[4:4 + count])
+                    received += count
+                elif not pending:
+                    stats.polls += 1
+                if sent == length and not data_in_flight and (
+                        received >= length or response[3] == commands.ENGINE_FINISHED):
+                    done = True
+        except IOError as e:
+            self._disconnected(e)
+        except BaseException:
+            self._abandon_pipeline()
+            raise
+        self._drain()
+        stats.elapsed = _clock() - started
+        return received
+
+    def _drain(self):
+        """Reads and discards the responses to reports still in flight.
+
+        If they have not all arrived after drain_timeout seconds, or reading one fails, the device is
+        closed, since a response still on its way would be taken for the response to a later command.
+        It is opened again on next use.
+
+        Returns:
+            True if every response was read.
+        """
+        if self._reader.drain(self.drain_timeout):
+            return True
+        self._close_hid()
+        return False
+
+    def _abandon_pipeline(self):
+        """Cleans up after a pipelined transfer that failed, without raising, so the failure is seen."""
+        try:
+            if self._drain():
+                self.cancel_transfer()
+        except Exception:
+            self._close_hid()
+
+    def _spi_transaction(self, read, length, settings):
+        """Runs a single SPI transaction, yielding received data as it arrives.
+
+        Arguments:
+            read: A function that returns the next given number of bytes of data to send.
+            length: The length of the transaction.
+            settings: The SPISettings in effect, used to pace reports.
+
+        Chunks are yielded as views onto the response buffer, and are only valid until the next report
+        is exchanged with the device.
+        """
+        report = self._report
+        response = self._response
+        stats = TransferStats(length)
+        self.last_transfer = stats
+        started = _clock()
+        sent = received = pending = rejected = 0
+        policy = self.retry_policy
+        ready = started
+        while sent < length or received < length:
+            if self._abort_requested:
+                self._abort_requested = False
+                self.cancel_transfer()
+                raise TransferCancelled("Transfer aborted after %d of %d bytes" % (received, length))
+            if not pending and sent < length:
+                pending = min(length - sent, 60)
+                data = read(pending)
+                if len(data) != pending:
+                    self.cancel_transfer()
+                    raise ValueError("Data ran out %d bytes before the end of the transfer" %
+                                     (length - sent - len(data)))
+                report[4:4 + pending] = data
+            delay = ready - _clock()
+            if delay > 0:
+                time.sleep(delay)
+                stats.waited += delay
+                for hook in self.hooks:
+                    hook.pacing(delay)
+            # The consumer may send other commands between chunks, so the header is written every time.
+            report[0] = commands.SPITransferCommand.COMMAND
+            report[1] = pending
+            report[2] = report[3] = 0x00
+
+            stats.reports += 1
+            self._exchange(commands.SPITransferCommand)
+            status = response[1]
+            if status != commands.STATUS_SUCCESS:
+                # The report was rejected without its data being taken, so it is resent as it is
+                # and the transfer carries on from there rather than starting again.
+                rejected += 1
+                if status == commands.STATUS_TRANSFER_IN_PROGRESS:
+                    stats.polls += 1
+                    if policy is None:
+                        continue
+                delay = None
+                if policy is not None:
+                    needed = settings.transfer_time(60) if status == commands.STATUS_TRANSFER_IN_PROGRESS else None
+                    delay = policy.delay(status, rejected, needed)
+                if delay is None:
+                    if rejected > 1:
+                        self.retry_stats.failures += 1
+                    self.cancel_transfer()
+                    raise command_exception(status)
+                self.retry_stats._retry(status, delay)
+                ready = _clock() + delay
+                continue
+            if rejected:
+                self.retry_stats.recoveries += 1
+                rejected = 0
+
+            if pending:
+                ready = _clock() + settings.transfer_time(
+                    pending, start=(sent == 0), end=(sent + pending == length))
+                sent += pending
+                pending = 0
+            elif not response[2]:
+                stats.polls += 1
+            if response[2]:
+                received += response[2]
+                try:
+                    yield self._response_view[4:4 + response[2]]
+                except GeneratorExit:
+                    # The consumer stopped early, so the rest of the transaction is abandoned.
+                    self.cancel_transfer()
+                    raise
+            if response[3] == commands.ENGINE_FINISHED and sent == length:
+                break
+
+        stats.elapsed = _clock() - started
 
     def cancel_transfer(self):
         """Cancels any ongoing transfers."""
-        self.sendCommand(commands.CancelTransferCommand())
+        self.send(commands.CancelTransferCommand)
+
+    def abort(self):
+        """Asks a transfer running on another thread to stop.
+
+        The transfer is cancelled on the device before its next report, and raises TransferCancelled.
+        """
+        self._abort_requested = True
+
+    def close(self):
+        """Closes the HID device. It is opened again if the MCP2210 is used afterwards."""
+        self._close_hid()
@@ -0,0 +1,204 @@
+"""Bulk decoding and encoding of sample frames, such as ADC readings, in SPI transfer data.
+
+Usage:
+    >>> layout = FrameLayout(channels=4, bits=12, offset=1)
+    >>> samples = layout.decode(dev.transfer(layout.encode(channels, template=b"\x06" + b"\x00" * 8)))
+    >>> samples[2]  # Every sample from channel 2
+
+Frames are decoded with NumPy when it is installed, and with array.array otherwise. Either way the
+whole buffer is processed at once rather than a word at a time, so it can hold any number of frames,
+for instance the concatenated output of many transfers or an Acquisition's ring buffer.
+"""
+from array import array
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class FrameLayout(object):
+    """Describes how samples are laid out in a frame of SPI data.
+
+    A frame holds one word per channel, interleaved, optionally preceded by `offset` bytes and
+    followed by padding up to `frame_size`. Each word is the smallest whole number of bytes that holds
+    `bits` bits, shifted left by `shift` bits.
+
+    Attributes:
+      channels: The number of channels, and so words, in each frame.
+      bits: The number of significant bits in each sample, up to 32.
+      byteorder: 'big' or 'little'.
+      signed: True if samples are two's complement.
+      shift: The number of unused bits below the sample in each word.
+      offset: The number of bytes before the first word in each frame.
+      word_size: The number of bytes in each word.
+      frame_size: The number of bytes in each frame.
+    """
+
+    def __init__(self, channels=1, bits=16, byteorder='big', signed=False, shift=0, offset=0, frame_size=None):
+        if not 0 < bits <= 32:
+            raise ValueError("Samples must be between 1 and 32 bits")
+        if byteorder not in ('big', 'little'):
+            raise ValueError("byteorder must be 'big' or 'little'")
+        self.channels = channels
+        self.bits = bits
+        self.byteorder = byteorder
+        self.signed = signed
+        self.shift = shift
+        self.offset = offset
+        self.word_size = (bits + shift + 7) // 8
+        if self.word_size > 4:
+            raise ValueError("Samples and their shift must fit in 32 bits")
+        minimum = offset + channels * self.word_size
+        self.frame_size = minimum if frame_size is None else frame_size
+        if self.frame_size < minimum:
+            raise ValueError("A frame needs at least %d bytes" % minimum)
+
+    def count(self, data):
+        """Returns the number of frames in data, which must be a whole number of frames long."""
+        if len(data) % self.frame_size:
+            raise ValueError("%d bytes is not a whole number of %d byte frames" % (len(data), self.frame_size))
+        return len(data) // self.frame_size
+
+    def _words(self, data):
+        """Returns the bytes of every word in data, in frame then channel order, without padding."""
+        data = memoryview(data)
+        length = self.channels * self.word_size
+        if self.offset == 0 and length == self.frame_size:
+            return data.tobytes()
+        frame_size, offset = self.frame_size, self.offset
+        return b''.join([data[i + offset:i + offset + length].tobytes()
+                         for i in range(0, len(data), frame_size)])
+
+    def _byte_positions(self):
+        """Yields, for each byte of a word in data, its position in a big endian 32 bit word."""
+        for i in range(self.word_size):
+            significance = self.word_size - 1 - i if self.byteorder == 'big' else i
+            yield i, 3 - significance
+
+    def decode(self, data):
+        """Decodes every frame in data.
+
+        Arguments:
+          data: A bytes-like object holding a whole number of frames.
+
+        Returns:
+          The samples of each channel. With NumPy, this is a (channels, frames) array; otherwise it
+          is a list of one array.array per channel. Either way, result[channel] is that channel's
+          samples.
+        """
+        count = self.count(data)
+        words = self._words(data)
+        if numpy is not None:
+            return self._decode_numpy(words, count)
+        return self._decode_array(words, count)
+
+    def _decode_numpy(self, words, count):
+        raw = numpy.frombuffer(words, numpy.uint8).reshape(-1, self.word_size)
+        padded = numpy.zeros((len(raw), 4), numpy.uint8)
+        for source, destination in self._byte_positions():
+            padded[:, destination] = raw[:, source]
+        values = padded.view('>u4').reshape(-1).astype(numpy.int64)
+        values = (values >> self.shift) & ((1 << self.bits) - 1)
+        if self.signed:
+            sign = 1 << (self.bits - 1)
+            values = (values ^ sign) - sign
+        dtype = _numpy_dtype(self.bits, self.signed)
+        return values.astype(dtype).reshape(count, self.channels).T
+
+    def _decode_array(self, words, count):
+        padded = bytearray(len(words) // self.word_size * 4)
+        for source, destination in self._byte_positions():
+            padded[destination::4] = words[source::self.word_size]
+        values = _array_from_bytes('I', bytes(padded))
+        if sys.byteorder == 'little':
+            values.byteswap()
+        mask = (1 << self.bits) - 1
+        if self.signed:
+            sign = 1 << (self.bits - 1)
+            shift = self.shift
+            values = array('i', [(((value >> shift) & mask) ^ sign) - sign for value in values])
+        elif self.shift or self.bits < self.word_size * 8:
+            shift = self.shift
+            values = array('I', [(value >> shift) & mask for value in values])
+        return [values[channel::self.channels] for channel in range(self.channels)]
+
+    def encode(self, channels, template=None):
+        """Builds frames of data from per-channel samples; the reverse of decode().
+
+        Arguments:
+          channels: The samples of each channel, as a (channels, frames) NumPy array or a sequence
+            of equal length sequences, one per channel.
+          template: The contents of each frame before the samples are written into it, for instance
+            a command byte in the offset. Defaults to zeros.
+
+        Returns:
+          A bytearray holding every frame.
+        """
+        if len(channels) != self.channels:
+            raise ValueError("Expected samples for %d channels, got %d" % (self.channels, len(channels)))
+        count = len(channels[0])
+        if template is None:
+            template = bytes(bytearray(self.frame_size))
+        elif len(template) != self.frame_size:
+            raise ValueError("The template must be %d bytes long" % self.frame_size)
+        if numpy is not None:
+            words = self._encode_numpy(channels, count)
+        else:
+            words = self._encode_array(channels, count)
+
+        output = bytearray(template) * count
+        length = self.channels * self.word_size
+        if self.offset == 0 and length == self.frame_size:
+            output[:] = words
+        else:
+            for frame in range(count):
+                start = frame * self.frame_size + self.offset
+                output[start:start + length] = words[frame * length:(frame + 1) * length]
+        return output
+
+    def _encode_numpy(self, channels, count):
+        values = numpy.asarray(channels, dtype=numpy.int64).T.reshape(-1)
+        values = ((values & ((1 << self.bits) - 1)) << self.shift).astype('>u4')
+        padded = values.view(numpy.uint8).reshape(-1, 4)
+        words = numpy.empty((len(padded), self.word_size), numpy.uint8)
+        for destination, source in self._byte_positions():
+            words[:, destination] = padded[:, source]
+        return words.tobytes()
+
+    def _encode_array(self, channels, count):
+        mask = (1 << self.bits) - 1
+        shift = self.shift
+        values = array('I', [(channel[frame] & mask) << shift
+                             for frame in range(count) for channel in channels])
+        if sys.byteorder == 'little':
+            values.byteswap()
+        padded = _array_to_bytes(values)
+        words = bytearray(len(values) * self.word_size)
+        for destination, source in self._byte_positions():
+            words[destination::self.word_size] = padded[source::4]
+        return words
+
+
+def _array_from_bytes(typecode, data):
+    values = array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)  # Python 2
+    return values
+
+
+def _array_to_bytes(values):
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()  # Python 2
+
+
+def _numpy_dtype(bits, signed):
+    if bits <= 8:
+        return numpy.int8 if signed else numpy.uint8
+    if bits <= 16:
+        return numpy.int16 if signed else numpy.uint16
+    return numpy.int32 if signed else numpy.uint32
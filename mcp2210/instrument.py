@@ -0,0 +1,166 @@
+"""Instrumentation of the USB traffic between the host and an MCP2210.
+
+Usage:
+    >>> stats = CommandStats()
+    >>> dev.add_hook(stats)
+    >>> dev.transfer(b"data")
+    >>> print(stats.format_table())
+"""
+from collections import OrderedDict
+from ctypes import sizeof
+from mcp2210 import commands
+
+
+HISTOGRAM_BUCKETS = 24
+
+
+class CommandHook(object):
+    """Base class for hooks registered with MCP2210.add_hook. The default methods do nothing."""
+
+    def command(self, command_class, report, response, write_time, read_time):
+        """Called after every report exchanged with the device.
+
+        Arguments:
+          command_class: The class of the command sent.
+          report: The report written to the device. Only valid for the duration of the call.
+          response: The report read back from the device. Only valid for the duration of the call.
+          write_time: Time in seconds spent writing the report.
+          read_time: Time in seconds spent waiting for and reading the response.
+        """
+
+    def pacing(self, seconds):
+        """Called whenever a transfer sleeps to let the SPI engine catch up."""
+
+
+class Histogram(object):
+    """A latency histogram with power of two buckets, in microseconds.
+
+    Bucket i counts latencies below 2**i microseconds that did not fit in bucket i - 1. The last bucket
+    also counts anything longer.
+    """
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.counts[bucket] += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, fraction):
+        """Returns the upper bound, in seconds, of the bucket containing the given fraction of samples."""
+        target = fraction * sum(self.counts)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return (1 << i) * 1e-6
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'buckets_us': [1 << i for i in range(HISTOGRAM_BUCKETS)],
+            'counts': list(self.counts),
+            'total': self.total,
+            'max': self.maximum,
+        }
+
+
+class CommandClassStats(object):
+    """Statistics for a single command class.
+
+    Attributes:
+      calls: The number of reports sent.
+      bytes_out: Bytes of command sent; for SPI transfers, the SPI data sent.
+      bytes_in: Bytes of response received; for SPI transfers, the SPI data received.
+      errors: A dict mapping non-zero status codes to the number of times they were returned.
+      write_latency: A Histogram of report write times.
+      read_latency: A Histogram of response read times.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.errors = {}
+        self.write_latency = Histogram()
+        self.read_latency = Histogram()
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'errors': dict(('0x%.2x' % code, count) for code, count in self.errors.items()),
+            'write_latency': self.write_latency.as_dict(),
+            'read_latency': self.read_latency.as_dict(),
+        }
+
+
+class CommandStats(CommandHook):
+    """Collects call counts, bytes moved, latencies and error codes per command class.
+
+    Attributes:
+      commands: An OrderedDict mapping command classes to CommandClassStats.
+      pacing_time: Total time in seconds transfers spent sleeping while the SPI engine was busy.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Discards everything collected so far."""
+        self.commands = OrderedDict()
+        self.pacing_time = 0.0
+
+    def command(self, command_class, report, response, write_time, read_time):
+        try:
+            stats = self.commands[command_class]
+        except KeyError:
+            stats = self.commands[command_class] = CommandClassStats()
+        stats.calls += 1
+        if command_class is commands.SPITransferCommand:
+            stats.bytes_out += report[1]
+            stats.bytes_in += response[2]
+        else:
+            stats.bytes_out += sizeof(command_class)
+            stats.bytes_in += sizeof(command_class.RESPONSE)
+        status = response[1]
+        if status:
+            stats.errors[status] = stats.errors.get(status, 0) + 1
+        stats.write_latency.add(write_time)
+        stats.read_latency.add(read_time)
+
+    def pacing(self, seconds):
+        self.pacing_time += seconds
+
+    def as_dict(self):
+        """Returns everything collected as a dict of plain values, keyed by command class name."""
+        return {
+            'commands': OrderedDict((cls.__name__, stats.as_dict()) for cls, stats in self.commands.items()),
+            'pacing_time': self.pacing_time,
+        }
+
+    def format_table(self):
+        """Returns everything collected as a text table, one row per command class.
+
+        Columns give the mean round trip time and the 99th percentile and maximum read latency.
+        """
+        lines = ["%-28s %8s %10s %10s %10s %10s %10s %s" % (
+            "command", "calls", "bytes out", "bytes in", "rtt us", "p99 rd us", "max rd us", "errors")]
+        for cls, stats in self.commands.items():
+            latency = stats.write_latency.total + stats.read_latency.total
+            errors = ' '.join('0x%.2x:%d' % item for item in sorted(stats.errors.items()))
+            lines.append("%-28s %8d %10d %10d %10.1f %10.0f %10.1f %s" % (
+                cls.__name__, stats.calls, stats.bytes_out, stats.bytes_in,
+                latency / stats.calls * 1e6, stats.read_latency.percentile(0.99) * 1e6,
+                stats.read_latency.maximum * 1e6, errors))
+        lines.append("pacing time: %.6fs" % self.pacing_time)
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.format_table()
@@ -0,0 +1,157 @@
+"""Pools of MCP2210 devices driven in parallel.
+
+Usage:
+    >>> pool = MCP2210Pool(my_vid, my_pid)
+    >>> results = pool.transfer(b"data")  # {serial_number: response, ...}
+    >>> pool.stats[serial_number].throughput
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import hid
+from mcp2210.device import MCP2210, _clock
+
+
+def enumerate_devices(vid, pid):
+    """Returns hidapi device information for every attached device with the given VID and PID.
+
+    Each entry is a dict with at least 'path' and 'serial_number' keys.
+    """
+    return hid.enumerate(vid, pid)
+
+
+def device_key(info):
+    """Returns the key used to identify a device in a pool: its serial number if it has one, else its path."""
+    return info.get('serial_number') or info['path']
+
+
+class DeviceStats(object):
+    """Accumulated transfer statistics for one device in a pool.
+
+    Attributes:
+      transfers: The number of transfers run.
+      bytes: The number of bytes transferred.
+      elapsed: Total time in seconds spent in transfers.
+    """
+
+    def __init__(self):
+        self.transfers = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """The achieved transfer rate in bytes per second."""
+        if not self.elapsed:
+            return 0.0
+        return self.bytes / self.elapsed
+
+    def __repr__(self):
+        return "<DeviceStats transfers=%d bytes=%d throughput=%.0f>" % (
+            self.transfers, self.bytes, self.throughput)
+
+
+class MCP2210Pool(object):
+    """A set of MCP2210 devices that run workloads in parallel from a thread pool.
+
+    Devices are identified by serial number, or by HID path for devices without one. Each device is
+    only ever used by one thread at a time.
+    """
+
+    def __init__(self, vid, pid, keys=None, max_workers=None, lazy=False):
+        """Constructor. Enumerates and opens every matching device concurrently.
+
+        Arguments:
+          vid: Vendor ID
+          pid: Product ID
+          keys: If given, only open devices with these serial numbers or paths.
+          max_workers: The number of worker threads. Defaults to one per device.
+          lazy: If true, each device is only opened when it is first used.
+        """
+        infos = [info for info in enumerate_devices(vid, pid) if keys is None or device_key(info) in keys]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(infos), 1))
+        futures = [self._executor.submit(MCP2210, vid, pid, serial_number=info.get('serial_number') or None,
+                                         path=info['path'], lazy=lazy) for info in infos]
+        wait(futures)
+        failed = [future for future in futures if future.exception() is not None]
+        if failed:
+            # Close the devices that did open, so one faulty adapter does not leak the others' handles.
+            for future in futures:
+                if future.exception() is None:
+                    future.result().close()
+            self._executor.shutdown()
+            failed[0].result()
+        self.devices = OrderedDict(zip((device_key(info) for info in infos),
+                                       (future.result() for future in futures)))
+        self.stats = OrderedDict((key, DeviceStats()) for key in self.devices)
+        self._locks = dict((key, threading.Lock()) for key in self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __getitem__(self, key):
+        return self.devices[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def run(self, function, keys=None):
+        """Calls function(device) for each device in parallel.
+
+        Arguments:
+          function: A function taking an MCP2210 instance.
+          keys: The devices to run on. Defaults to every device in the pool.
+
+        Returns:
+          A dict mapping device keys to the values function returned. If any call raised an
+          exception, the first such exception is raised once every call has finished.
+        """
+        return self._run(lambda key, device: function(device), keys)
+
+    def _run(self, function, keys=None):
+        keys = list(self.devices) if keys is None else list(keys)
+        futures = [self._executor.submit(self._run_one, key, function) for key in keys]
+        wait(futures)
+        return OrderedDict((key, future.result()) for key, future in zip(keys, futures))
+
+    def _run_one(self, key, function):
+        with self._locks[key]:
+            return function(key, self.devices[key])
+
+    def transfer(self, data):
+        """Transfers data over SPI on every device in parallel, updating stats for each device.
+
+        Arguments:
+          data: The data to send to every device, or a dict mapping device keys to the data to send
+            to each of them.
+
+        Returns:
+          A dict mapping device keys to the data returned by each SPI device.
+        """
+        if isinstance(data, dict):
+            payloads = data
+        else:
+            payloads = dict((key, data) for key in self.devices)
+
+        def transfer(key, device):
+            started = _clock()
+            response = device.transfer(payloads[key])
+            stats = self.stats[key]
+            stats.elapsed += _clock() - started
+            stats.bytes += len(response)
+            stats.transfers += 1
+            return response
+
+        return self._run(transfer, payloads.keys())
+
+    def close(self):
+        """Closes every device and shuts down the worker threads."""
+        self.run(lambda device: device.close())
+        self._executor.shutdown()
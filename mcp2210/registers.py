@@ -0,0 +1,228 @@
+"""Register map access to SPI peripherals such as ADCs and IO expanders.
+
+Usage:
+    >>> regs = RegisterMap(dev, [
+    ...     Register('config', 0x00),
+    ...     Register('status', 0x01, read_only=True, volatile=True),
+    ...     Register('data', 0x02, width=2, read_only=True, volatile=True),
+    ... ])
+    >>> regs.read_many(['status', 'data'])  # One SPI transaction
+    OrderedDict([('status', 1), ('data', 1234)])
+    >>> regs['config'] = 0x42
+    >>> regs['config'] = 0x42  # Already known; nothing is sent
+
+Each transaction sends a command header, made from the address of the first register and a read or
+write flag, followed by the data of one or more registers. Peripherals are assumed to increment the
+address after each byte, so registers that sit next to each other can be read or written in a single
+burst.
+"""
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+
+
+_Register = namedtuple('Register', ['name', 'address', 'width', 'read_only', 'volatile'])
+
+
+class Register(_Register):
+    """A register of an SPI peripheral.
+
+    Attributes:
+      name: The name the register is accessed by.
+      address: The byte address of the register.
+      width: The width of the register in bytes.
+      read_only: True if the register cannot be written.
+      volatile: True if the peripheral can change the value of the register, so it is never cached.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name, address, width=1, read_only=False, volatile=False):
+        return super(Register, cls).__new__(cls, name, address, width, read_only, volatile)
+
+    @property
+    def end(self):
+        """The address following the last byte of the register."""
+        return self.address + self.width
+
+
+def _to_bytes(value, width, byteorder):
+    if not 0 <= value < (1 << (width * 8)):
+        raise ValueError("0x%x does not fit in %d bytes" % (value, width))
+    data = bytearray((value >> (8 * i)) & 0xFF for i in range(width))
+    if byteorder == 'big':
+        data.reverse()
+    return data
+
+
+def _from_bytes(data, byteorder):
+    data = bytearray(data)
+    if byteorder == 'big':
+        data.reverse()
+    return sum(byte << (8 * i) for i, byte in enumerate(data))
+
+
+class RegisterMap(object):
+    """Reads and writes the registers of an SPI peripheral over an MCP2210.
+
+    Accesses to registers at adjacent addresses are merged into burst transactions. The values of
+    registers that are not volatile are cached, so reading them again does not touch the bus, and
+    writing the value a register is known to hold sends nothing.
+
+    Attributes:
+      transactions: The number of SPI transactions run so far.
+    """
+
+    def __init__(self, device, registers, read_flag=0x80, write_flag=0x00, address_size=1,
+                 byteorder='big', max_burst=None):
+        """Constructor.
+
+        Arguments:
+          device: An MCP2210 instance, with its transfer settings set up for the peripheral.
+          registers: A list of Registers.
+          read_flag: Bits set in the command header for reads.
+          write_flag: Bits set in the command header for writes.
+          address_size: The size of the command header in bytes.
+          byteorder: 'big' or 'little', the byte order of registers wider than a byte.
+          max_burst: The most data bytes the peripheral accepts in one burst, or None for no limit.
+        """
+        self.device = device
+        self.registers = OrderedDict((register.name, register) for register in registers)
+        self.read_flag = read_flag
+        self.write_flag = write_flag
+        self.address_size = address_size
+        self.byteorder = byteorder
+        self.max_burst = max_burst
+        self.transactions = 0
+        self._cache = {}
+        self._pending = None
+
+    def __getitem__(self, name):
+        return self.read(name)
+
+    def __setitem__(self, name, value):
+        self.write(name, value)
+
+    def header(self, address, read):
+        """Returns the command header for an access starting at address.
+
+        Override this for peripherals with a different command format.
+        """
+        command = address | (self.read_flag if read else self.write_flag)
+        return _to_bytes(command, self.address_size, 'big')
+
+    def _bursts(self, registers):
+        """Splits registers, sorted by address, into runs of adjacent registers no longer than max_burst."""
+        bursts = []
+        for register in sorted(registers, key=lambda register: register.address):
+            if bursts:
+                last = bursts[-1]
+                length = register.end - last[0].address
+                if last[-1].end == register.address and (self.max_burst is None or length <= self.max_burst):
+                    last.append(register)
+                    continue
+            bursts.append([register])
+        return bursts
+
+    def _transfer(self, address, read, data):
+        header = self.header(address, read)
+        self.transactions += 1
+        return self.device.transfer(bytes(header + data))[len(header):]
+
+    def read(self, name):
+        """Returns the value of a register, from the cache if it is not volatile and already known."""
+        return self.read_many([name])[name]
+
+    def read_many(self, names):
+        """Reads several registers, merging adjacent ones into bursts.
+
+        Arguments:
+          names: The names of the registers to read.
+
+        Returns:
+          An OrderedDict mapping register names to values, in the order given.
+        """
+        registers = [self.registers[name] for name in names]
+        values = {}
+        missing = []
+        for register in registers:
+            if register.name in self._cache:
+                values[register.name] = self._cache[register.name]
+            else:
+                missing.append(register)
+        for burst in self._bursts(set(missing)):
+            start = burst[0].address
+            data = self._transfer(start, True, bytearray(burst[-1].end - start))
+            for register in burst:
+                offset = register.address - start
+                value = _from_bytes(data[offset:offset + register.width], self.byteorder)
+                values[register.name] = value
+                if not register.volatile:
+                    self._cache[register.name] = value
+        return OrderedDict((register.name, values[register.name]) for register in registers)
+
+    def write(self, name, value):
+        """Writes a register, unless it is known to hold value already."""
+        self.write_many([(name, value)])
+
+    def write_many(self, values):
+        """Writes several registers, merging adjacent ones into bursts.
+
+        Registers that are not volatile and are known to hold the value given already are skipped.
+        Inside a batch() block, writes are held back until the block exits.
+
+        Arguments:
+          values: A dict or a list of (name, value) pairs.
+        """
+        if isinstance(values, dict):
+            values = values.items()
+        staged = OrderedDict()
+        for name, value in values:
+            register = self.registers[name]
+            if register.read_only:
+                raise ValueError("Register %s is read only" % name)
+            _to_bytes(value, register.width, self.byteorder)
+            staged[name] = value
+        if self._pending is not None:
+            self._pending.update(staged)
+            return
+        changed = dict((name, value) for name, value in staged.items()
+                       if self.registers[name].volatile or self._cache.get(name) != value)
+        for burst in self._bursts(self.registers[name] for name in changed):
+            data = bytearray()
+            for register in burst:
+                data += _to_bytes(changed[register.name], register.width, self.byteorder)
+            self._transfer(burst[0].address, False, data)
+            for register in burst:
+                if not register.volatile:
+                    self._cache[register.name] = changed[register.name]
+
+    @contextmanager
+    def batch(self):
+        """Returns a context manager that holds back writes until it exits, then sends them in bursts.
+
+        Nothing is sent if the block raises an exception.
+        """
+        outermost = self._pending is None
+        if outermost:
+            self._pending = OrderedDict()
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                self._pending = None
+            raise
+        if outermost:
+            pending, self._pending = self._pending, None
+            self.write_many(pending.items())
+
+    def invalidate(self, names=None):
+        """Forgets cached register values, so they are read from the peripheral next time.
+
+        Arguments:
+          names: The registers to forget. Defaults to all of them.
+        """
+        if names is None:
+            self._cache.clear()
+        else:
+            for name in names:
+                self._cache.pop(name, None)
@@ -0,0 +1,237 @@
+"""Sampling of the MCP2210's GP6 interrupt event counter.
+
+Usage:
+    >>> sampler = EventCounterSampler(dev, capacity=100000)
+    >>> sampler.start()  # Polls in a background thread as fast as the USB link allows
+    >>> time.sleep(10)
+    >>> sampler.buffer.rate(window=1.0)  # Events per second over the last second
+    >>> sampler.stop()
+
+Samples are kept in a fixed-size ring buffer, so memory use stays the same however long the sampler
+runs; once it is full, the oldest samples are overwritten. Deltas, intervals and rates are computed
+over the whole buffer at once with NumPy when it is installed, and with array.array otherwise.
+"""
+from array import array
+from operator import sub
+import threading
+from mcp2210.device import _clock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+COUNTER_MASK = 0xFFFF  # The MCP2210 event counter is 16 bits wide
+
+
+def _count_typecode():
+    """Returns the array typecode counts are stored with.
+
+    'Q' does not exist on Python 2, where 'L' is 64 bits wide on most platforms. Failing both, doubles
+    hold whole counts exactly up to 2 ** 53.
+    """
+    for typecode in ('Q', 'L'):
+        try:
+            if array(typecode).itemsize >= 8:
+                return typecode
+        except ValueError:
+            pass
+    return 'd'
+
+
+COUNT_TYPECODE = _count_typecode()
+
+
+class SampleBuffer(object):
+    """A fixed-size ring buffer of (timestamp, count) samples, backed by arrays.
+
+    deltas(), intervals() and rates() return NumPy arrays when NumPy is installed, and array.array
+    otherwise.
+
+    Attributes:
+      capacity: The number of samples kept.
+      total: The number of samples ever appended, including those since overwritten.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self._timestamps = array('d', [0.0]) * capacity
+        self._counts = array(COUNT_TYPECODE, [0]) * capacity
+        self._next = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def overwritten(self):
+        """The number of samples that have been overwritten by newer ones."""
+        return self.total - len(self)
+
+    def append(self, timestamp, count):
+        i = self._next
+        self._timestamps[i] = timestamp
+        self._counts[i] = count
+        self._next = i + 1 if i + 1 < self.capacity else 0
+        self.total += 1
+
+    def clear(self):
+        self.total = 0
+        self._next = 0
+
+    def _ordered(self, values):
+        if self.total < self.capacity:
+            return values[:self.total]
+        return values[self._next:] + values[:self._next]
+
+    def _ordered_numpy(self, values):
+        values = numpy.frombuffer(values, numpy.dtype(values.typecode))
+        if self.total < self.capacity:
+            return values[:self.total]
+        return numpy.concatenate((values[self._next:], values[:self._next]))
+
+    def _index(self, i):
+        """Returns the array index of the i'th oldest sample."""
+        if self.total < self.capacity:
+            return i
+        return (self._next + i) % self.capacity
+
+    def samples(self):
+        """Returns copies of the timestamps and counts held, oldest first, as a pair of arrays."""
+        return self._ordered(self._timestamps), self._ordered(self._counts)
+
+    def latest(self):
+        """Returns the newest (timestamp, count) sample, or None if the buffer is empty."""
+        if not self.total:
+            return None
+        i = self._index(len(self) - 1)
+        return self._timestamps[i], self._counts[i]
+
+    def deltas(self):
+        """Returns an array of the number of events between each pair of consecutive samples."""
+        if numpy is not None:
+            return numpy.diff(self._ordered_numpy(self._counts))
+        counts = self._ordered(self._counts)
+        return array(COUNT_TYPECODE, map(sub, counts[1:], counts[:-1]))
+
+    def intervals(self):
+        """Returns an array of the time in seconds between each pair of consecutive samples."""
+        if numpy is not None:
+            return numpy.diff(self._ordered_numpy(self._timestamps))
+        timestamps = self._ordered(self._timestamps)
+        return array('d', map(sub, timestamps[1:], timestamps[:-1]))
+
+    def rates(self):
+        """Returns an array of the event rate, in events per second, between each pair of consecutive samples."""
+        if numpy is not None:
+            intervals = self.intervals()
+            return numpy.divide(self.deltas(), intervals, out=numpy.zeros(len(intervals)), where=intervals != 0)
+        return array('d', [delta / interval if interval else 0.0
+                           for delta, interval in zip(self.deltas(), self.intervals())])
+
+    def rate(self, window=None):
+        """Returns the mean event rate in events per second.
+
+        Arguments:
+          window: If given, only samples from the last window seconds are used. Defaults to every
+            sample held.
+        """
+        length = len(self)
+        if length < 2:
+            return 0.0
+        first, last = 0, self._index(length - 1)
+        if window is not None:
+            # Bisect for the oldest sample inside the window.
+            cutoff = self._timestamps[last] - window
+            low, high = 0, length - 1
+            while low < high:
+                middle = (low + high) // 2
+                if self._timestamps[self._index(middle)] < cutoff:
+                    low = middle + 1
+                else:
+                    high = middle
+            first = low
+        first = self._index(first)
+        elapsed = self._timestamps[last] - self._timestamps[first]
+        if elapsed <= 0:
+            return 0.0
+        return (self._counts[last] - self._counts[first]) / elapsed
+
+
+class EventCounterSampler(object):
+    """Polls the GP6 event counter of an MCP2210 and records timestamped counts in a SampleBuffer.
+
+    Counts are cumulative from the first sample, with the 16 bit device counter unwrapped. The
+    counter is read without being reset, so no events are lost between reads, but more than 65535
+    events between two samples cannot be told apart from fewer. Timestamps are the midpoint of each
+    read's round trip.
+
+    Attributes:
+      device: The MCP2210.
+      buffer: The SampleBuffer samples are recorded in.
+    """
+
+    def __init__(self, device, capacity=65536):
+        """Constructor.
+
+        Arguments:
+          device: An MCP2210 with GP6 set up as the interrupt pin. It should not be used by other
+            threads while sampling runs in the background.
+          capacity: The number of samples kept.
+        """
+        self.device = device
+        self.buffer = SampleBuffer(capacity)
+        self._raw = None
+        self._count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Reads the counter once, records the sample and returns the cumulative count."""
+        before = _clock()
+        raw = self.device.read_event_count()
+        after = _clock()
+        if self._raw is not None:
+            self._count += (raw - self._raw) & COUNTER_MASK
+        self._raw = raw
+        self.buffer.append((before + after) / 2, self._count)
+        return self._count
+
+    def run(self, duration=None, samples=None):
+        """Samples as fast as possible until stop() is called, or a duration or number of samples is reached.
+
+        Arguments:
+          duration: How long to sample for in seconds.
+          samples: How many samples to take.
+        """
+        deadline = None if duration is None else _clock() + duration
+        sample = self.sample
+        stopped = self._stop.is_set
+        taken = 0
+        while not stopped():
+            sample()
+            taken += 1
+            if samples is not None and taken >= samples:
+                break
+            if deadline is not None and _clock() >= deadline:
+                break
+
+    def start(self):
+        """Starts sampling in a background thread."""
+        if self._thread is not None:
+            raise RuntimeError("Sampler is already running")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="mcp2210-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops a background sampler started with start(), waiting for it to finish."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,411 @@
+"""A software model of an MCP2210, for testing and benchmarking without hardware.
+
+SimulatedMCP2210 implements the parts of the hidapi device interface that MCP2210 uses, and answers
+every command in mcp2210.commands. It models the SPI engine's timing at the configured bit rate and
+delays, including busy and engine status responses, and optionally the USB frame timing of a full
+speed HID device.
+
+Usage:
+    >>> sim = SimulatedMCP2210(frame_time=0.001)
+    >>> dev = MCP2210(0x04D8, 0x00DE, hid_device=sim)
+    >>> dev.transfer(b"data")  # Looped back by the default peripheral
+    b'data'
+"""
+from collections import Counter, deque
+from ctypes import addressof, sizeof, string_at
+import math
+import threading
+import time
+from mcp2210 import commands
+from mcp2210.device import _clock
+
+
+class LoopbackPeripheral(object):
+    """An SPI peripheral that returns the data it is sent.
+
+    Peripherals used with SimulatedMCP2210 implement select(), exchange() and deselect(), which are
+    called when chip select is asserted, for every report of data clocked, and when chip select is
+    released.
+    """
+
+    def select(self, chip_select):
+        """Called at the start of a transaction with the active chip select pin states."""
+
+    def exchange(self, data):
+        """Returns the bytes clocked in from the peripheral while data is clocked out to it."""
+        return data
+
+    def deselect(self):
+        """Called at the end of a transaction."""
+
+
+class RegisterPeripheral(LoopbackPeripheral):
+    """An SPI peripheral with a bank of byte registers, as accessed by mcp2210.registers.RegisterMap.
+
+    The first byte of each transaction is the address of the first register, with read_flag set for
+    reads. The address increments after each byte.
+
+    Attributes:
+      registers: A bytearray with the register contents.
+    """
+
+    def __init__(self, size=128, read_flag=0x80):
+        self.registers = bytearray(size)
+        self.read_flag = read_flag
+        self._address = None
+
+    def select(self, chip_select):
+        self._address = None
+
+    def exchange(self, data):
+        response = bytearray(len(data))
+        for i, byte in enumerate(bytearray(data)):
+            if self._address is None:
+                self._reading = bool(byte & self.read_flag)
+                self._address = byte & ~self.read_flag
+                continue
+            address = self._address % len(self.registers)
+            if self._reading:
+                response[i] = self.registers[address]
+            else:
+                self.registers[address] = byte
+            self._address += 1
+        return bytes(response)
+
+
+def _encode_string(value):
+    """Encodes a USB string descriptor body the way the MCP2210 returns it."""
+    data = value.encode('utf-16-le')
+    return len(data) + 2, data
+
+
+class SimulatedMCP2210(object):
+    """A simulated MCP2210 behind the hidapi device interface.
+
+    Attributes:
+      chip_settings, boot_chip_settings: ChipSettings structures.
+      transfer_settings, boot_transfer_settings: SPISettings structures.
+      usb_settings: A USBSettings structure.
+      gpio_value, gpio_direction: GPIO bitmasks.
+      eeprom: A bytearray of the 256 byte EEPROM.
+      event_count: The GP6 interrupt event counter.
+      event_rate: Events per second added to event_count while the simulator runs.
+      bus_held_until: Until this time on the monotonic clock, SPI transfer reports are rejected as if
+        an external master held the bus.
+      serial_number: The USB serial number to report.
+      plugged_in: False while the simulated adapter is unplugged.
+      counts: A Counter of the reports received, by command code.
+    """
+
+    def __init__(self, frame_time=0.0, peripheral=None, vid=0x04D8, pid=0x00DE, event_rate=0.0):
+        """Constructor.
+
+        Arguments:
+          frame_time: The USB frame time in seconds. Each report written takes the next free OUT frame,
+            and its response the next free IN frame after that. Zero disables USB timing.
+          peripheral: The SPI peripheral attached, such as a LoopbackPeripheral.
+          vid: The USB vendor ID to report.
+          pid: The USB product ID to report.
+          event_rate: The rate of simulated events on GP6, in events per second.
+        """
+        self.frame_time = frame_time
+        self.peripheral = peripheral or LoopbackPeripheral()
+        self.chip_settings = commands.ChipSettings()
+        self.boot_chip_settings = commands.ChipSettings()
+        self.transfer_settings = commands.SPISettings(
+            bit_rate=12000000, idle_cs=0x1FF, active_cs=0x1FE, spi_tx_size=4)
+        self.boot_transfer_settings = commands.SPISettings.from_buffer_copy(self.transfer_settings)
+        self.usb_settings = commands.USBSettings(vid, pid, 0x80, 50)
+        self.strings = {
+            commands.GetUSBManufacturerCommand.SUBCOMMAND: _encode_string(u"Microchip Technology Inc."),
+            commands.GetUSBProductCommand.SUBCOMMAND: _encode_string(u"MCP2210 USB to SPI Master"),
+        }
+        self.gpio_value = 0x0000
+        self.gpio_direction = 0x01FF
+        self.eeprom = bytearray(b'\xff' * 256)
+        self.event_count = 0
+        self.event_rate = event_rate
+        self._events_since = None
+        self.bus_held_until = 0.0
+        self.counts = Counter()
+        self.serial_number = u"0000000000"
+        self.plugged_in = True
+        self.is_open = False
+
+        self._condition = threading.Condition()
+        self._responses = deque()
+        self._last_out = self._last_in = 0.0
+        self._handlers = {
+            commands.SetBootSettingsCommand.COMMAND: self._set_boot_settings,
+            commands.GetBootSettingsCommand.COMMAND: self._get_boot_settings,
+            commands.SendPasswordCommand.COMMAND: self._send_password,
+            commands.GetSPISettingsCommand.COMMAND: self._get_spi_settings,
+            commands.SetSPISettingsCommand.COMMAND: self._set_spi_settings,
+            commands.GetChipSettingsCommand.COMMAND: self._get_chip_settings,
+            commands.SetChipSettingsCommand.COMMAND: self._set_chip_settings,
+            commands.GetGPIODirectionCommand.COMMAND: self._get_gpio,
+            commands.SetGPIODirectionCommand.COMMAND: self._set_gpio,
+            commands.GetGPIOValueCommand.COMMAND: self._get_gpio,
+            commands.SetGPIOValueCommand.COMMAND: self._set_gpio,
+            commands.ReadEEPROMCommand.COMMAND: self._read_eeprom,
+            commands.WriteEEPROMCommand.COMMAND: self._write_eeprom,
+            commands.SPITransferCommand.COMMAND: self._spi_transfer,
+            commands.CancelTransferCommand.COMMAND: self._cancel_transfer,
+            commands.GetEventCountCommand.COMMAND: self._get_event_count,
+        }
+        self._reset_engine()
+
+    # hidapi device interface
+
+    def open(self, vid=0, pid=0, serial_number=None):
+        if not self.plugged_in:
+            raise IOError("open failed")
+        self.is_open = True
+
+    def open_path(self, path):
+        if not self.plugged_in:
+            raise IOError("open failed")
+        self.is_open = True
+
+    def get_serial_number_string(self):
+        return self.serial_number
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        """Queues a report for processing in the next free OUT frame, blocking until that frame."""
+        report = bytearray(64)
+        data = bytearray(data)[:64]
+        report[:len(data)] = data
+        with self._condition:
+            if not self.is_open:
+                raise IOError("Device is not open")
+            now = _clock()
+            if self.frame_time:
+                frame = self.frame_time
+                processed = max(math.ceil(now / frame) * frame, self._last_out + frame)
+                ready = max(processed + frame, self._last_in + frame)
+                self._last_out, self._last_in = processed, ready
+            else:
+                processed = ready = now
+            self._responses.append((ready, self._handle(report, processed)))
+            self._condition.notify_all()
+        delay = processed - _clock()
+        if delay > 0:
+            time.sleep(delay)
+        return len(data)
+
+    def read(self, max_length, timeout_ms=0):
+        """Returns the next response as a list of ints, waiting for it as hidapi would."""
+        deadline = _clock() + timeout_ms / 1000.0 if timeout_ms > 0 else None
+        with self._condition:
+            while not self._responses:
+                if not self.is_open:
+                    raise IOError("Device is not open")
+                remaining = None if deadline is None else deadline - _clock()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+            ready, response = self._responses[0]
+            if deadline is not None and ready > deadline:
+                return []
+            self._responses.popleft()
+        delay = ready - _clock()
+        if delay > 0:
+            time.sleep(delay)
+        return list(response[:max_length])
+
+    def set_nonblocking(self, value):
+        pass
+
+    # Command handling
+
+    def _handle(self, report, now):
+        code = report[0]
+        self.counts[code] += 1
+        try:
+            handler = self._handlers[code]
+        except KeyError:
+            raise ValueError("Unsupported command code 0x%.2x" % code)
+        response = handler(report, now)
+        out = bytearray(64)
+        out[:sizeof(response)] = string_at(addressof(response), sizeof(response))
+        return out
+
+    def _header(self, report, status=commands.STATUS_SUCCESS):
+        return commands.ResponseHeader(report[0], status, report[1], 0)
+
+    def _set_boot_settings(self, report, now):
+        subcommand = report[1]
+        if subcommand == commands.SetBootSPISettingsCommand.SUBCOMMAND:
+            self.boot_transfer_settings = commands.SetBootSPISettingsCommand.from_buffer_copy(report).settings
+        elif subcommand == commands.SetBootChipSettingsCommand.SUBCOMMAND:
+            self.boot_chip_settings = commands.SetBootChipSettingsCommand.from_buffer_copy(report).settings
+        elif subcommand == commands.SetBootUSBSettingsCommand.SUBCOMMAND:
+            self.usb_settings = commands.SetBootUSBSettingsCommand.from_buffer_copy(report).settings
+        elif subcommand in self.strings:
+            command = commands.SetUSBStringCommand.from_buffer_copy(report)
+            self.strings[subcommand] = (command.str_len, bytes(bytearray(command.str[:command.str_len - 2])))
+        else:
+            raise ValueError("Unsupported boot settings subcommand 0x%.2x" % subcommand)
+        return commands.EmptyResponse(self._header(report))
+
+    def _get_boot_settings(self, report, now):
+        subcommand = report[1]
+        header = self._header(report)
+        if subcommand == commands.GetBootSPISettingsCommand.SUBCOMMAND:
+            return commands.GetSPISettingsResponse(header, self.boot_transfer_settings)
+        elif subcommand == commands.GetBootChipSettingsCommand.SUBCOMMAND:
+            return commands.GetChipSettingsResponse(header, self.boot_chip_settings)
+        elif subcommand == commands.GetBootUSBSettingsCommand.SUBCOMMAND:
+            settings = self.usb_settings
+            response = commands.GetUSBSettingsResponse(header)
+            response.vid, response.pid = settings.vid, settings.pid
+            response.power_option, response.current_request = settings.power_option, settings.current_request
+            return response
+        elif subcommand in self.strings:
+            length, data = self.strings[subcommand]
+            response = commands.GetUSBStringResponse(header, length, 0x03)
+            response.str[:len(data)] = list(bytearray(data))
+            return response
+        raise ValueError("Unsupported boot settings subcommand 0x%.2x" % subcommand)
+
+    def _send_password(self, report, now):
+        return commands.EmptyResponse(self._header(report))
+
+    def _get_spi_settings(self, report, now):
+        return commands.GetSPISettingsResponse(self._header(report), self.transfer_settings)
+
+    def _set_spi_settings(self, report, now):
+        self.transfer_settings = commands.SetSPISettingsCommand.from_buffer_copy(report).settings
+        return commands.EmptyResponse(self._header(report))
+
+    def _get_chip_settings(self, report, now):
+        return commands.GetChipSettingsResponse(self._header(report), self.chip_settings)
+
+    def _set_chip_settings(self, report, now):
+        self.chip_settings = commands.SetChipSettingsCommand.from_buffer_copy(report).settings
+        # The chip applies the default GPIO outputs and directions immediately, not only at boot.
+        self.gpio_value = self.chip_settings.gpio_outputs
+        self.gpio_direction = self.chip_settings.gpio_directions
+        return commands.EmptyResponse(self._header(report))
+
+    def _get_gpio(self, report, now):
+        if report[0] == commands.GetGPIOValueCommand.COMMAND:
+            value = self.gpio_value
+        else:
+            value = self.gpio_direction
+        return commands.GetGPIOResponse(self._header(report), value)
+
+    def _set_gpio(self, report, now):
+        value = commands.SetGPIOCommand.from_buffer_copy(report).gpio
+        if report[0] == commands.SetGPIOValueCommand.COMMAND:
+            self.gpio_value = value
+        else:
+            self.gpio_direction = value
+        return commands.EmptyResponse(self._header(report))
+
+    def _read_eeprom(self, report, now):
+        address = report[1]
+        return commands.ReadEEPROMResponse(report[0], commands.STATUS_SUCCESS, address, self.eeprom[address])
+
+    def _write_eeprom(self, report, now):
+        self.eeprom[report[1]] = report[2]
+        return commands.EmptyResponse(self._header(report))
+
+    def _get_event_count(self, report, now):
+        if self._events_since is not None:
+            self.event_count += self.event_rate * (now - self._events_since)
+        self._events_since = now
+        response = commands.EventCountResponse(self._header(report), int(self.event_count) & 0xFFFF)
+        if report[1] == commands.ResetEventCountCommand.SUBCOMMAND:
+            self.event_count -= int(self.event_count)
+        return response
+
+    # SPI engine
+
+    def _reset_engine(self):
+        self._remaining = 0
+        self._to_receive = 0
+        self._busy_until = 0.0
+        self._clocking = deque()
+        self._received = bytearray()
+
+    def unplug(self):
+        """Simulates unplugging the adapter.
+
+        The device is closed, and opening it fails until plug() is called. Volatile state is lost as it
+        would be on power loss: current settings revert to the boot settings.
+        """
+        with self._condition:
+            self.plugged_in = False
+            self.is_open = False
+            self._responses.clear()
+            self.chip_settings = commands.ChipSettings.from_buffer_copy(self.boot_chip_settings)
+            self.transfer_settings = commands.SPISettings.from_buffer_copy(self.boot_transfer_settings)
+            self.gpio_value = self.boot_chip_settings.gpio_outputs
+            self.gpio_direction = self.boot_chip_settings.gpio_directions
+            self.event_count = 0
+            self._reset_engine()
+            self._condition.notify_all()
+
+    def plug(self):
+        """Simulates plugging the adapter back in after unplug()."""
+        self.plugged_in = True
+
+    def hold_bus(self, duration):
+        """Simulates an external SPI master holding the bus for duration seconds."""
+        self.bus_held_until = _clock() + duration
+
+    def _spi_transfer(self, report, now):
+        if now < self.bus_held_until:
+            return commands.SPITransferResponse(report[0], commands.STATUS_SPI_BUS_UNAVAILABLE)
+        count = report[1]
+        settings = self.transfer_settings
+        response = commands.SPITransferResponse(report[0], commands.STATUS_SUCCESS)
+
+        if count and not self._to_receive:
+            self._remaining = self._to_receive = settings.spi_tx_size
+            self._busy_until = now
+            self.peripheral.select(settings.active_cs)
+        if not self._to_receive:
+            response.engine_status = commands.ENGINE_FINISHED
+            return response
+
+        if count and now < self._busy_until:
+            response.status = commands.STATUS_TRANSFER_IN_PROGRESS
+            response.engine_status = commands.ENGINE_STARTED
+            return response
+
+        count = min(count, self._remaining)
+        if count:
+            first = self._remaining == settings.spi_tx_size
+            self._remaining -= count
+            self._busy_until = max(now, self._busy_until) + settings.transfer_time(
+                count, start=first, end=not self._remaining)
+            data = bytes(report[4:4 + count])
+            self._clocking.append((self._busy_until, bytearray(self.peripheral.exchange(data))))
+
+        while self._clocking and self._clocking[0][0] <= now:
+            self._received += self._clocking.popleft()[1]
+        chunk = self._received[:60]
+        del self._received[:60]
+        response.length = len(chunk)
+        response._data[:len(chunk)] = list(chunk)
+        self._to_receive -= len(chunk)
+
+        if not self._to_receive:
+            response.engine_status = commands.ENGINE_FINISHED
+            self.peripheral.deselect()
+        elif chunk:
+            response.engine_status = commands.ENGINE_DATA_PENDING
+        else:
+            response.engine_status = commands.ENGINE_STARTED
+        return response
+
+    def _cancel_transfer(self, report, now):
+        if self._to_receive:
+            self.peripheral.deselect()
+        self._reset_engine()
+        return commands.DeviceStatusResponse(report[0], commands.STATUS_SUCCESS)
@@ -9,4 +9,4 @@ setup(name="mcp2210",
       author_email="nick@arachnidlabs.com",
       url="https://github.com/arachnidlabs/mcp2210/",
       packages=["mcp2210"],
-      install_requires=["hidapi>=0.7.99"])
+      install_requires=["hidapi>=0.7.99", "futures; python_version < '3'"])
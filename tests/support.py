@@ -0,0 +1,43 @@
+"""Helpers for tests run against the simulated MCP2210."""
+from mcp2210 import MCP2210
+from mcp2210.simulator import LoopbackPeripheral, SimulatedMCP2210
+
+
+def simulated_device(frame_time=0.0, peripheral=None, **kwargs):
+    """Returns a (simulator, device) pair."""
+    simulator = SimulatedMCP2210(frame_time=frame_time, peripheral=peripheral)
+    return simulator, MCP2210(0x04D8, 0x00DE, hid_device=simulator, **kwargs)
+
+
+def payload(length):
+    return bytes(bytearray(i & 0xFF for i in range(length)))
+
+
+class RecordingPeripheral(LoopbackPeripheral):
+    """A loopback peripheral that records the data of every transaction, from chip select to release.
+
+    If hold_after is given, the simulator's SPI bus is held by an external master for hold_for seconds
+    once that many reports of data have been clocked.
+    """
+
+    def __init__(self, simulator=None, hold_after=None, hold_for=0.0):
+        self.simulator = simulator
+        self.hold_after = hold_after
+        self.hold_for = hold_for
+        self.transactions = []
+        self.exchanges = 0
+        self._current = None
+
+    def select(self, chip_select):
+        self._current = bytearray()
+
+    def exchange(self, data):
+        self._current += data
+        self.exchanges += 1
+        if self.exchanges == self.hold_after:
+            self.simulator.hold_bus(self.hold_for)
+        return data
+
+    def deselect(self):
+        self.transactions.append(bytes(self._current))
+        self._current = None
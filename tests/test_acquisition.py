@@ -0,0 +1,55 @@
+import unittest
+from mcp2210 import SPITransaction
+from mcp2210.acquisition import Acquisition
+from tests.support import simulated_device
+
+
+class AcquisitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device()
+
+    def test_run_with_callback(self):
+        frames = []
+        acquisition = Acquisition(self.device, b"\x01\x02\x03", rate=1000, capacity=4,
+                                  callback=lambda timestamp, frame: frames.append(frame.tobytes()))
+        acquisition.run(frames=5)
+        self.assertEqual(frames, [b"\x01\x02\x03"] * 5)
+        self.assertEqual(acquisition.stats.frames, 5)
+
+    def test_iterate(self):
+        acquisition = Acquisition(self.device, b"abcd", rate=1000, capacity=64)
+        acquisition.start(frames=10)
+        items = list(acquisition)
+        acquisition.stop()
+        self.assertEqual([frame for timestamp, frame in items], [b"abcd"] * 10)
+        timestamps = [timestamp for timestamp, frame in items]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_transactions(self):
+        acquisition = Acquisition(self.device, [SPITransaction(0x01, 0, 1000000, b"ab"),
+                                                SPITransaction(0x02, 0, 1000000, b"cde")], rate=1000)
+        self.assertEqual(acquisition.frame_size, 5)
+        acquisition.run(frames=2)
+        self.assertEqual(bytes(acquisition.buffer[:10]), b"abcdeabcde")
+
+    def test_read_times_out(self):
+        acquisition = Acquisition(self.device, b"ab", rate=5)
+        acquisition.start()
+        try:
+            self.assertEqual(acquisition.read(timeout=1.0)[1], b"ab")
+            self.assertIsNone(acquisition.read(timeout=0.01))
+        finally:
+            acquisition.stop()
+
+    def test_capacity_too_small(self):
+        with self.assertRaises(ValueError):
+            Acquisition(self.device, b"ab", rate=1000, capacity=1)
+
+    def test_read_without_thread(self):
+        acquisition = Acquisition(self.device, b"ab", rate=1000)
+        self.assertIsNone(acquisition.read(timeout=0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+try:
+    import asyncio
+    from mcp2210.aio import AsyncMCP2210
+except (ImportError, SyntaxError):
+    AsyncMCP2210 = None
+from tests.support import RecordingPeripheral, payload, simulated_device
+
+
+@unittest.skipIf(AsyncMCP2210 is None, "mcp2210.aio requires Python 3.5 or later")
+class AsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RecordingPeripheral()
+        self.simulator, device = simulated_device(peripheral=self.peripheral)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.device = AsyncMCP2210(device)
+
+    def tearDown(self):
+        self.wait(self.device.close())
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def wait(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def test_transfer(self):
+        data = payload(500)
+        self.assertEqual(self.wait(self.device.transfer(data)), data)
+
+    def test_concurrent_calls_run_in_order(self):
+        results = self.wait(asyncio.gather(self.device.transfer(b"one"), self.device.transfer(b"two")))
+        self.assertEqual(results, [b"one", b"two"])
+        self.assertEqual(self.peripheral.transactions, [b"one", b"two"])
+
+    def test_settings(self):
+        settings = self.wait(self.device.get('transfer_settings'))
+        settings.bit_rate = 1000000
+        self.wait(self.device.set('transfer_settings', settings))
+        self.assertEqual(self.simulator.transfer_settings.bit_rate, 1000000)
+
+    def test_unknown_setting_rejected(self):
+        with self.assertRaises(AttributeError):
+            self.wait(self.device.get('no_such_setting'))
+        with self.assertRaises(AttributeError):
+            self.wait(self.device.get('hid'))
+        with self.assertRaises(AttributeError):
+            self.wait(self.device.set('connected', False))
+
+    def test_gpio(self):
+        self.wait(self.device.gpio_direction.set_raw(0x1FE))
+        self.wait(self.device.gpio.set(0, 1))
+        self.assertEqual(self.simulator.gpio_value & 1, 1)
+        self.assertEqual(self.wait(self.device.gpio.get(0)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
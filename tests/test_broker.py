@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mcp2210 import SPITransaction
+from mcp2210.broker import Broker, MCP2210Proxy
+from tests.support import payload, simulated_device
+
+
+class BrokerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'broker.sock')
+        self.simulator, device = simulated_device()
+        self.other_simulator, other = simulated_device()
+        self.broker = Broker(self.path, [(u'SN0', device), (u'SN1', other)])
+        self.broker.start()
+        self.proxy = MCP2210Proxy(self.path)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.broker.close()
+        shutil.rmtree(self.directory)
+
+    def test_transfer(self):
+        self.assertEqual(self.proxy.key, u'SN0')
+        data = payload(300)
+        self.assertEqual(self.proxy.transfer(data), data)
+        buffer = bytearray(4)
+        self.assertEqual(self.proxy.transfer_into(b"data", buffer), 4)
+        self.assertEqual(buffer, bytearray(b"data"))
+
+    def test_transfer_batch(self):
+        transactions = [SPITransaction(0x01, 0, 1000000, b"one"), SPITransaction(0x02, 1, 2000000, b"two")]
+        self.assertEqual(self.proxy.transfer_batch(transactions), [b"one", b"two"])
+
+    def test_settings(self):
+        settings = self.proxy.transfer_settings
+        settings.bit_rate = 1000000
+        self.proxy.transfer_settings = settings
+        self.assertEqual(self.simulator.transfer_settings.bit_rate, 1000000)
+        self.assertEqual(self.proxy.transfer_settings.bit_rate, 1000000)
+
+    def test_gpio_and_eeprom(self):
+        self.proxy.gpio_direction.raw = 0x1FE
+        self.proxy.gpio[0] = 1
+        self.assertEqual(self.simulator.gpio_value & 1, 1)
+        self.proxy.eeprom[0:2] = b"\x12\x34"
+        self.assertEqual(self.proxy.eeprom[0:2], b"\x12\x34")
+        self.assertEqual(self.simulator.eeprom[0:2], bytearray(b"\x12\x34"))
+
+    def test_errors_forwarded(self):
+        with self.assertRaises(ValueError):
+            self.proxy.transfer(payload(0x10000))
+
+    def test_choose_device(self):
+        with MCP2210Proxy(self.path, key=u'SN1') as proxy:
+            self.assertEqual(proxy.key, u'SN1')
+            proxy.gpio_direction.raw = 0x1FE
+            proxy.gpio[0] = 1
+        self.assertEqual(self.other_simulator.gpio_value & 1, 1)
+        self.assertEqual(self.simulator.gpio_value & 1, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
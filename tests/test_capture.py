@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mcp2210 import MCP2210, commands
+from mcp2210.capture import IN, OUT, Capture, CaptureError, HIDRecorder, ReplayHID, decode
+from mcp2210.simulator import SimulatedMCP2210
+from tests.support import payload
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.capture')
+        device = MCP2210(0x04D8, 0x00DE, hid_device=HIDRecorder(SimulatedMCP2210(), self.path))
+        self.response = device.transfer(payload(200))
+        device.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records(self):
+        with Capture(self.path) as capture:
+            directions = [record.direction for record in capture]
+            self.assertEqual(directions, [OUT, IN] * (len(capture) // 2))
+            self.assertEqual(capture.find(capture.timestamp(3)), 3)
+            self.assertEqual(capture[-1].direction, IN)
+
+    def test_decode(self):
+        with Capture(self.path) as capture:
+            messages = list(decode(capture))
+            transfers = [message for message in messages
+                         if message.command_class is commands.SPITransferCommand and message.record.direction == IN]
+            self.assertEqual(b"".join(message.message.data for message in transfers), self.response)
+
+    def test_records_pipelined_transfer(self):
+        path = os.path.join(self.directory, 'pipelined.capture')
+        device = MCP2210(0x04D8, 0x00DE, hid_device=HIDRecorder(SimulatedMCP2210(), path))
+        device.pipeline_depth = 4
+        response = device.transfer(payload(1000))
+        device.close()
+        with Capture(path) as capture:
+            directions = [record.direction for record in capture]
+            self.assertEqual(directions.count(OUT), directions.count(IN))
+            transfers = [message for message in decode(capture)
+                         if message.command_class is commands.SPITransferCommand and message.record.direction == IN]
+            self.assertEqual(b"".join(message.message.data for message in transfers), response)
+
+    def test_replay(self):
+        with Capture(self.path) as capture:
+            device = MCP2210(0x04D8, 0x00DE, hid_device=ReplayHID(capture))
+            self.assertEqual(device.transfer(payload(200)), self.response)
+            device.close()
+
+    def test_replay_rejects_different_traffic(self):
+        with Capture(self.path) as capture:
+            device = MCP2210(0x04D8, 0x00DE, hid_device=ReplayHID(capture))
+            with self.assertRaises(CaptureError):
+                device.transfer(b"other data")
+            device.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
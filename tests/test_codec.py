@@ -0,0 +1,56 @@
+from ctypes import addressof, sizeof, string_at
+import unittest
+from mcp2210 import commands
+from mcp2210.codec import codec_for
+from tests.support import simulated_device
+
+
+def encoded(command):
+    report = bytearray(64)
+    report[:sizeof(command)] = string_at(addressof(command), sizeof(command))
+    return report
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_encode_matches_ctypes(self):
+        settings = commands.SPISettings(bit_rate=1000000, idle_cs=0x1FF, active_cs=0x1FE, spi_tx_size=8)
+        for command_class, args, command in [
+                (commands.GetSPISettingsCommand, (), commands.GetSPISettingsCommand()),
+                (commands.SetSPISettingsCommand, (settings,), commands.SetSPISettingsCommand(settings)),
+                (commands.WriteEEPROMCommand, (3, 0x42), commands.WriteEEPROMCommand(3, 0x42)),
+                (commands.SPITransferCommand, (4, 0, b"data"), commands.SPITransferCommand(b"data"))]:
+            report = bytearray(64)
+            codec_for(command_class).encode_into(report, *args)
+            self.assertEqual(report, encoded(command), command_class.__name__)
+
+    def test_decode_matches_ctypes(self):
+        settings = commands.SPISettings(bit_rate=1000000, idle_cs=0x1FF, active_cs=0x1FE, spi_tx_size=8)
+        response = encoded(commands.GetSPISettingsResponse(
+            commands.ResponseHeader(commands.GetSPISettingsCommand.COMMAND, 0, 0, 0), settings))
+        view = codec_for(commands.GetSPISettingsCommand).decode(response)
+        self.assertEqual(view.settings.bit_rate, 1000000)
+        self.assertEqual(view.settings.spi_tx_size, 8)
+
+    def test_view_copy(self):
+        response = bytearray(64)
+        response[0:4] = b"\x50\x00\x07\x42"
+        view = codec_for(commands.ReadEEPROMCommand).decode(response)
+        copy = view.copy()
+        response[3] = 0
+        self.assertEqual(view.data, 0)
+        self.assertEqual(copy.data, 0x42)
+
+
+class SendTest(unittest.TestCase):
+
+    def test_send(self):
+        simulator, device = simulated_device()
+        simulator.eeprom[7] = 0x42
+        self.assertEqual(device.send(commands.ReadEEPROMCommand, 7).data, 0x42)
+        device.send(commands.WriteEEPROMCommand, 7, 0x43)
+        self.assertEqual(simulator.eeprom[7], 0x43)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from mcp2210 import commands
+from tests.support import simulated_device
+
+
+class EEPROMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device()
+        self.simulator.eeprom[0:8] = b"\x01\x02\x03\x04\x05\x06\x07\x08"
+
+    def writes(self):
+        return self.simulator.counts[commands.WriteEEPROMCommand.COMMAND]
+
+    def test_reads_from_image(self):
+        self.assertEqual(self.device.eeprom[0:4], b"\x01\x02\x03\x04")
+        self.simulator.counts.clear()
+        self.assertEqual(self.device.eeprom[4:5], b"\x05")
+        self.assertEqual(sum(self.simulator.counts.values()), 0)
+
+    def test_only_changed_bytes_written(self):
+        self.device.eeprom[0:8] = b"\x01\x02\xff\x04\x05\x06\x07\xee"
+        self.assertEqual(self.writes(), 2)
+        self.assertEqual(self.simulator.eeprom[0:8], bytearray(b"\x01\x02\xff\x04\x05\x06\x07\xee"))
+
+    def test_unchanged_write_sends_nothing(self):
+        self.device.eeprom[0:8] = b"\x01\x02\x03\x04\x05\x06\x07\x08"
+        self.assertEqual(self.writes(), 0)
+
+    def test_staged_writes_flushed_on_exit(self):
+        with self.device.eeprom.staged(verify=True):
+            self.device.eeprom[0] = 0x10
+            self.device.eeprom[0] = 0x20
+            self.assertEqual(self.writes(), 0)
+        self.assertEqual(self.writes(), 1)
+        self.assertEqual(self.simulator.eeprom[0], 0x20)
+
+    def test_staged_writes_discarded_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.device.eeprom.staged():
+                self.device.eeprom[0] = 0x10
+                raise RuntimeError()
+        self.assertEqual(self.writes(), 0)
+        self.assertEqual(self.simulator.eeprom[0], 0x01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from mcp2210 import frames
+from mcp2210.frames import FrameLayout
+
+
+class FrameLayoutTests(object):
+    """Tests run both with and without NumPy."""
+
+    numpy = None
+
+    def setUp(self):
+        self._numpy = frames.numpy
+        frames.numpy = self.numpy
+
+    def tearDown(self):
+        frames.numpy = self._numpy
+
+    def decode(self, layout, data):
+        return [[int(value) for value in channel] for channel in layout.decode(data)]
+
+    def test_decode_interleaved(self):
+        layout = FrameLayout(channels=2, bits=16)
+        self.assertEqual(self.decode(layout, b"\x00\x01\x00\x02\x00\x03\x01\x04"), [[1, 3], [2, 0x104]])
+
+    def test_decode_offset_and_mask(self):
+        layout = FrameLayout(bits=12, offset=1)
+        self.assertEqual(self.decode(layout, b"\xaa\xff\xff\xaa\x01\x23"), [[0xFFF, 0x123]])
+
+    def test_decode_signed(self):
+        layout = FrameLayout(bits=12, byteorder='little', signed=True, shift=4)
+        self.assertEqual(self.decode(layout, b"\xf0\xff\x00\x80\x10\x00"), [[-1, -2048, 1]])
+
+    def test_round_trip(self):
+        layout = FrameLayout(channels=3, bits=10, byteorder='little', shift=2, offset=1, frame_size=8)
+        samples = [[1, 2], [3, 4], [1023, 0]]
+        data = layout.encode(samples, template=b"\x06" + b"\x00" * 7)
+        self.assertEqual(len(data), 16)
+        self.assertEqual(data[0], 0x06)
+        self.assertEqual(data[8], 0x06)
+        self.assertEqual(self.decode(layout, data), samples)
+
+    def test_partial_frame_rejected(self):
+        with self.assertRaises(ValueError):
+            FrameLayout(channels=2, bits=16).decode(b"\x00\x01\x00")
+
+
+@unittest.skipIf(frames.numpy is None, "NumPy is not installed")
+class NumpyFrameLayoutTest(FrameLayoutTests, unittest.TestCase):
+    numpy = frames.numpy
+
+
+class ArrayFrameLayoutTest(FrameLayoutTests, unittest.TestCase):
+    numpy = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from mcp2210 import commands
+from mcp2210.device import CACHE_WRITE_THROUGH
+from tests.support import simulated_device
+
+
+class GPIOTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device()
+        self.device.gpio_direction.raw = 0x1F0  # GP0-GP3 outputs, the rest inputs
+
+    def test_batch_sends_one_command(self):
+        self.simulator.counts.clear()
+        with self.device.gpio.batch():
+            self.device.gpio[0] = 1
+            self.device.gpio[1] = 1
+            self.device.gpio[2] = 1
+        self.assertEqual(self.simulator.counts[commands.SetGPIOValueCommand.COMMAND], 1)
+        self.assertEqual(self.simulator.gpio_value & 0x7, 0x7)
+
+    def test_unchanged_batch_sends_nothing(self):
+        self.device.gpio[0] = 1
+        self.simulator.counts.clear()
+        with self.device.gpio.batch():
+            self.device.gpio[0] = 0
+            self.device.gpio[0] = 1
+        self.assertEqual(self.simulator.counts[commands.SetGPIOValueCommand.COMMAND], 0)
+
+    def test_input_pins_read_fresh_by_default(self):
+        self.assertEqual(self.device.gpio[4], 0)
+        self.simulator.gpio_value |= 1 << 4
+        self.assertEqual(self.device.gpio[4], 1)
+
+    def test_output_pins_served_from_cache(self):
+        self.device.gpio[0] = 1
+        self.simulator.counts.clear()
+        self.assertEqual(self.device.gpio[0], 1)
+        self.assertEqual(sum(self.simulator.counts.values()), 0)
+
+    def test_chip_settings_write_invalidates_cache(self):
+        self.device.gpio[0] = 1
+        settings = self.device.chip_settings
+        settings.gpio_outputs = 0
+        settings.gpio_directions = 0x1F1
+        self.device.chip_settings = settings
+        self.simulator.counts.clear()
+        self.assertEqual(self.device.gpio[0], 0)
+        self.assertEqual(self.device.gpio_direction.raw, 0x1F1)
+        self.assertEqual(self.simulator.counts[commands.GetGPIOValueCommand.COMMAND], 1)
+        self.assertEqual(self.simulator.counts[commands.GetGPIODirectionCommand.COMMAND], 1)
+
+    def test_write_through_policy_caches_inputs(self):
+        self.device.gpio.policy = CACHE_WRITE_THROUGH
+        self.assertEqual(self.device.gpio[4], 0)
+        self.simulator.gpio_value |= 1 << 4
+        self.assertEqual(self.device.gpio[4], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import unittest
+from mcp2210 import commands
+from mcp2210.instrument import CommandStats, Histogram
+from tests.support import payload, simulated_device
+
+
+class CommandStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device()
+        self.stats = CommandStats()
+        self.device.add_hook(self.stats)
+
+    def test_counts_commands(self):
+        self.device.transfer(payload(100))
+        self.device.gpio.raw = 0x0001
+        transfers = self.stats.commands[commands.SPITransferCommand]
+        self.assertEqual(transfers.calls, self.simulator.counts[commands.SPITransferCommand.COMMAND])
+        self.assertEqual(transfers.bytes_out, 100)
+        self.assertEqual(transfers.bytes_in, 100)
+        self.assertEqual(self.stats.commands[commands.SetGPIOValueCommand].calls, 1)
+        self.assertIn("SPITransferCommand", self.stats.format_table())
+        json.dumps(self.stats.as_dict())
+
+    def test_remove_hook(self):
+        self.device.remove_hook(self.stats)
+        self.device.transfer(b"data")
+        self.assertEqual(len(self.stats.commands), 0)
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentile(self):
+        histogram = Histogram()
+        for seconds in (0.000001, 0.000002, 0.000003, 0.001):
+            histogram.add(seconds)
+        self.assertEqual(histogram.percentile(0.5), 4e-6)
+        self.assertEqual(histogram.percentile(1.0), 1024e-6)
+        self.assertEqual(histogram.maximum, 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from mcp2210 import SPITransaction
+from tests.support import RecordingPeripheral, payload, simulated_device
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RecordingPeripheral()
+        self.simulator, self.device = simulated_device(frame_time=0.001, peripheral=self.peripheral)
+        self.peripheral.simulator = self.simulator
+        self.device.pipeline_depth = 4
+
+    def tearDown(self):
+        self.device.close()
+
+    def test_transfer(self):
+        data = payload(1200)
+        self.assertEqual(self.device.transfer(data), data)
+        self.assertEqual(self.peripheral.transactions, [data])
+        self.assertGreater(self.device.last_transfer.depth, 1)
+
+    def test_commands_after_transfer_stay_in_step(self):
+        self.device.transfer(payload(600))
+        self.assertEqual(self.device.transfer_settings.spi_tx_size, 600)
+        self.assertEqual(self.device.transfer_batch([SPITransaction(0x01, 0, 1000000, b"ab")]), [b"ab"])
+
+    def test_resumes_after_held_bus(self):
+        self.peripheral.hold_after = 10
+        self.peripheral.hold_for = 0.01
+        data = payload(3000)
+        self.assertEqual(self.device.transfer(data), data)
+        # No data was sent behind the rejected report, so the transaction resumed without the
+        # peripheral seeing anything twice.
+        self.assertEqual(self.peripheral.transactions, [data])
+        self.assertEqual(self.device.retry_stats.recoveries, 1)
+
+    def test_bus_held_briefly_at_any_depth(self):
+        data = payload(1200)
+        for depth in (2, 8):
+            self.device.pipeline_depth = depth
+            for hold_after in (1, 5, 13):
+                self.peripheral.transactions = []
+                self.peripheral.exchanges = 0
+                self.peripheral.hold_after = hold_after
+                self.peripheral.hold_for = 0.002
+                self.assertEqual(self.device.transfer(data), data)
+                self.assertEqual(self.peripheral.transactions, [data])
+
+    def test_reader_failure_does_not_hang(self):
+        data = payload(600)
+        self.device.transfer(data)
+        read = self.simulator.read
+
+        def fail_once(max_length, timeout_ms=0):
+            self.simulator.read = read
+            raise ValueError("read failed")
+        self.simulator.read = fail_once
+        with self.assertRaises(ValueError):
+            self.device.transfer(data)
+        self.assertEqual(self.device.transfer(data), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import hid
+from mcp2210 import DeviceDisconnected
+from mcp2210.pool import MCP2210Pool
+from mcp2210.simulator import SimulatedMCP2210
+
+
+class PoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fakes = []
+        self.unplugged = None
+        self._enumerate, self._device = hid.enumerate, hid.device
+        hid.enumerate = lambda vid=0, pid=0: [
+            {'path': ('/dev/hidraw%d' % i).encode('ascii'), 'serial_number': u'SN%d' % i} for i in range(3)]
+        hid.device = self.open_fake
+
+    def tearDown(self):
+        hid.enumerate, hid.device = self._enumerate, self._device
+
+    def open_fake(self):
+        fake = SimulatedMCP2210()
+        self.fakes.append(fake)
+        if len(self.fakes) == self.unplugged:
+            fake.unplug()
+        return fake
+
+    def test_transfer(self):
+        with MCP2210Pool(0x04D8, 0x00DE) as pool:
+            self.assertEqual(list(pool), [u'SN0', u'SN1', u'SN2'])
+            self.assertEqual(pool.transfer(b"data"), {u'SN0': b"data", u'SN1': b"data", u'SN2': b"data"})
+            self.assertEqual([stats.transfers for stats in pool.stats.values()], [1, 1, 1])
+            self.assertEqual(pool[u'SN1'].serial_number, u'SN1')
+
+    def test_transfer_different_data(self):
+        with MCP2210Pool(0x04D8, 0x00DE) as pool:
+            self.assertEqual(pool.transfer({u'SN0': b"zero", u'SN2': b"two"}), {u'SN0': b"zero", u'SN2': b"two"})
+            self.assertEqual(pool.stats[u'SN1'].transfers, 0)
+
+    def test_keys(self):
+        with MCP2210Pool(0x04D8, 0x00DE, keys=[u'SN1']) as pool:
+            self.assertEqual(list(pool), [u'SN1'])
+            self.assertEqual(len(self.fakes), 1)
+
+    def test_failed_open_closes_other_devices(self):
+        self.unplugged = 2
+        with self.assertRaises(DeviceDisconnected):
+            MCP2210Pool(0x04D8, 0x00DE)
+        self.assertEqual(len(self.fakes), 3)
+        self.assertEqual([fake.is_open for fake in self.fakes], [False, False, False])
+
+    def test_run(self):
+        with MCP2210Pool(0x04D8, 0x00DE) as pool:
+            results = pool.run(lambda device: device.transfer_settings.spi_tx_size)
+            self.assertEqual(sorted(results), [u'SN0', u'SN1', u'SN2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from mcp2210 import DeviceDisconnected, ReconnectPolicy, commands
+from tests.support import simulated_device
+
+
+class ReconnectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device(lazy=True)
+
+    def test_lazy_open(self):
+        self.assertFalse(self.device.connected)
+        self.assertEqual(sum(self.simulator.counts.values()), 0)
+        self.assertEqual(self.device.transfer(b"data"), b"data")
+        self.assertTrue(self.device.connected)
+        self.assertEqual(self.device.serial_number, self.simulator.serial_number)
+
+    def test_restores_volatile_state(self):
+        settings = self.device.transfer_settings
+        settings.bit_rate = 1000000
+        self.device.transfer_settings = settings
+        self.device.gpio_direction.raw = 0x1F0
+        self.device.gpio[1] = 1
+
+        self.simulator.unplug()
+        with self.assertRaises(DeviceDisconnected):
+            self.device.transfer(b"data")
+        self.assertFalse(self.device.connected)
+        self.simulator.plug()
+
+        self.simulator.counts.clear()
+        self.assertEqual(self.device.transfer(b"data"), b"data")
+        self.assertEqual(self.device.reconnects, 1)
+        self.assertEqual(self.simulator.transfer_settings.bit_rate, 1000000)
+        self.assertEqual(self.simulator.gpio_direction, 0x1F0)
+        self.assertEqual(self.simulator.gpio_value & 0x2, 0x2)
+        # Written back from the cache, without reading anything first.
+        for command in (commands.GetSPISettingsCommand, commands.GetChipSettingsCommand,
+                        commands.GetGPIODirectionCommand, commands.GetGPIOValueCommand):
+            self.assertEqual(self.simulator.counts[command.COMMAND], 0)
+
+    def test_gives_up_after_policy_attempts(self):
+        self.device.connect()
+        self.device.reconnect_policy = ReconnectPolicy(attempts=3, initial_delay=0.001)
+        self.simulator.unplug()
+        with self.assertRaises(DeviceDisconnected):
+            self.device.transfer(b"data")
+        with self.assertRaises(DeviceDisconnected):
+            self.device.transfer(b"data")
+        self.simulator.plug()
+        self.assertEqual(self.device.transfer(b"data"), b"data")
+
+
+if __name__ == '__main__':
+    unittest.main()
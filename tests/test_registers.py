@@ -0,0 +1,86 @@
+import unittest
+from mcp2210.registers import Register, RegisterMap
+from mcp2210.simulator import LoopbackPeripheral
+from tests.support import simulated_device
+
+
+class RegisterPeripheral(LoopbackPeripheral):
+    """A peripheral with 16 bytes of registers, addressed by a header byte with the top bit set for reads."""
+
+    def __init__(self):
+        self.memory = bytearray(16)
+        self.transactions = 0
+        self._address = None
+
+    def select(self, chip_select):
+        self.transactions += 1
+        self._address = None
+
+    def exchange(self, data):
+        out = bytearray()
+        for byte in bytearray(data):
+            if self._address is None:
+                self._read = bool(byte & 0x80)
+                self._address = byte & 0x7F
+                out.append(0)
+                continue
+            if self._read:
+                out.append(self.memory[self._address])
+            else:
+                self.memory[self._address] = byte
+                out.append(0)
+            self._address += 1
+        return bytes(out)
+
+
+class RegisterMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RegisterPeripheral()
+        self.simulator, self.device = simulated_device(peripheral=self.peripheral)
+        self.registers = RegisterMap(self.device, [
+            Register('config', 0x00),
+            Register('status', 0x01, read_only=True, volatile=True),
+            Register('data', 0x02, width=2, read_only=True, volatile=True),
+            Register('limit', 0x08, width=2),
+        ])
+        self.peripheral.memory[0:4] = b"\x42\x01\x12\x34"
+
+    def test_adjacent_reads_coalesced(self):
+        values = self.registers.read_many(['data', 'config', 'status'])
+        self.assertEqual(list(values.items()), [('data', 0x1234), ('config', 0x42), ('status', 0x01)])
+        self.assertEqual(self.peripheral.transactions, 1)
+
+    def test_cached_reads(self):
+        self.assertEqual(self.registers['config'], 0x42)
+        self.assertEqual(self.registers['status'], 0x01)
+        self.peripheral.memory[0:2] = b"\x00\x02"
+        self.assertEqual(self.registers['config'], 0x42)
+        self.assertEqual(self.registers['status'], 0x02)
+        self.registers.invalidate(['config'])
+        self.assertEqual(self.registers['config'], 0x00)
+
+    def test_unchanged_write_skipped(self):
+        self.registers['limit'] = 0x1000
+        self.assertEqual(self.peripheral.memory[8:10], bytearray(b"\x10\x00"))
+        self.registers['limit'] = 0x1000
+        self.assertEqual(self.peripheral.transactions, 1)
+
+    def test_batch(self):
+        with self.registers.batch():
+            self.registers['config'] = 0x01
+            self.registers['limit'] = 0x0203
+            self.assertEqual(self.peripheral.transactions, 0)
+        self.assertEqual(self.peripheral.transactions, 2)
+        self.assertEqual(self.peripheral.memory[0], 0x01)
+        self.assertEqual(self.peripheral.memory[8:10], bytearray(b"\x02\x03"))
+
+    def test_invalid_writes_rejected(self):
+        with self.assertRaises(ValueError):
+            self.registers['status'] = 0
+        with self.assertRaises(ValueError):
+            self.registers['config'] = 0x100
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from mcp2210 import RetryPolicy, SPIBusUnavailable, commands
+from tests.support import RecordingPeripheral, payload, simulated_device
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RecordingPeripheral()
+        self.simulator, self.device = simulated_device(peripheral=self.peripheral)
+        self.peripheral.simulator = self.simulator
+
+    def test_recovers_from_held_bus(self):
+        self.simulator.hold_bus(0.005)
+        self.assertEqual(self.device.transfer(b"data"), b"data")
+        self.assertEqual(self.device.retry_stats.recoveries, 1)
+        self.assertTrue(self.device.retry_stats.retries[commands.STATUS_SPI_BUS_UNAVAILABLE])
+        self.assertEqual(self.peripheral.transactions, [b"data"])
+
+    def test_resumes_mid_transfer(self):
+        self.peripheral.hold_after = 5
+        self.peripheral.hold_for = 0.005
+        data = payload(1000)
+        self.assertEqual(self.device.transfer(data), data)
+        # The transaction carried on from the rejected report rather than starting again.
+        self.assertEqual(self.peripheral.transactions, [data])
+        self.assertEqual(self.device.retry_stats.recoveries, 1)
+
+    def test_gives_up_after_policy_attempts(self):
+        self.device.retry_policy = RetryPolicy(attempts=2, initial_delay=0.001)
+        self.simulator.hold_bus(1.0)
+        with self.assertRaises(SPIBusUnavailable):
+            self.device.transfer(b"data")
+        self.assertEqual(self.device.retry_stats.failures, 1)
+
+    def test_no_policy_raises_immediately(self):
+        self.device.retry_policy = None
+        self.simulator.hold_bus(1.0)
+        with self.assertRaises(SPIBusUnavailable) as context:
+            self.device.transfer(b"data")
+        self.assertTrue(context.exception.transient)
+        self.assertEqual(sum(self.device.retry_stats.retries.values()), 0)
+
+    def test_policy_delay(self):
+        policy = RetryPolicy(attempts=3, initial_delay=0.001, max_delay=0.003, backoff=2.0)
+        code = commands.STATUS_SPI_BUS_UNAVAILABLE
+        self.assertEqual([policy.delay(code, attempt) for attempt in (1, 2, 3, 4)], [0.001, 0.002, 0.003, None])
+        self.assertEqual(policy.delay(code, 1, needed=0.01), 0.01)
+        self.assertIsNone(policy.delay(commands.STATUS_ACCESS_DENIED, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
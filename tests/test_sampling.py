@@ -0,0 +1,83 @@
+import unittest
+from mcp2210 import sampling
+from mcp2210.sampling import EventCounterSampler, SampleBuffer
+from tests.support import simulated_device
+
+
+class SampleBufferTests(object):
+    """Tests run both with and without NumPy."""
+
+    numpy = None
+
+    def setUp(self):
+        self._numpy = sampling.numpy
+        sampling.numpy = self.numpy
+
+    def tearDown(self):
+        sampling.numpy = self._numpy
+
+    def test_ring(self):
+        buffer = SampleBuffer(4)
+        for i in range(6):
+            buffer.append(float(i), i * 10)
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.overwritten, 2)
+        timestamps, counts = buffer.samples()
+        self.assertEqual(list(timestamps), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(list(counts), [20, 30, 40, 50])
+        self.assertEqual(buffer.latest(), (5.0, 50))
+
+    def test_deltas_and_rates(self):
+        buffer = SampleBuffer(8)
+        for timestamp, count in [(0.0, 0), (0.5, 10), (1.0, 30), (2.0, 40)]:
+            buffer.append(timestamp, count)
+        self.assertEqual(list(buffer.deltas()), [10, 20, 10])
+        self.assertEqual(list(buffer.intervals()), [0.5, 0.5, 1.0])
+        self.assertEqual(list(buffer.rates()), [20.0, 40.0, 10.0])
+        self.assertEqual(buffer.rate(), 20.0)
+        self.assertEqual(buffer.rate(window=1.0), 10.0)
+        buffer.append(2.0, 50)
+        self.assertEqual(list(buffer.rates())[-1], 0.0)
+
+    def test_rate_needs_two_samples(self):
+        buffer = SampleBuffer(4)
+        self.assertEqual(buffer.rate(), 0.0)
+        self.assertIsNone(buffer.latest())
+
+    def test_wrapped_deltas(self):
+        buffer = SampleBuffer(3)
+        for i in range(5):
+            buffer.append(float(i), i * i)
+        self.assertEqual(list(buffer.deltas()), [5, 7])
+        self.assertEqual(list(buffer.intervals()), [1.0, 1.0])
+
+
+@unittest.skipIf(sampling.numpy is None, "NumPy is not installed")
+class NumpySampleBufferTest(SampleBufferTests, unittest.TestCase):
+    numpy = sampling.numpy
+
+
+class ArraySampleBufferTest(SampleBufferTests, unittest.TestCase):
+    numpy = None
+
+
+class EventCounterSamplerTest(unittest.TestCase):
+
+    def test_counter_unwrapped(self):
+        simulator, device = simulated_device()
+        sampler = EventCounterSampler(device, capacity=16)
+        simulator.event_count = 0xFFF0
+        sampler.sample()
+        simulator.event_count = 0x0010
+        self.assertEqual(sampler.sample(), 0x20)
+
+    def test_run(self):
+        simulator, device = simulated_device()
+        sampler = EventCounterSampler(device, capacity=16)
+        sampler.run(samples=20)
+        self.assertEqual(sampler.buffer.total, 20)
+        self.assertEqual(len(sampler.buffer), 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from mcp2210 import commands
+from tests.support import simulated_device
+
+
+class SettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator, self.device = simulated_device()
+        self.device.prefetch_settings(['transfer_settings', 'chip_settings'])
+        self.simulator.counts.clear()
+
+    def test_served_from_cache(self):
+        self.assertEqual(self.device.transfer_settings.bit_rate, 12000000)
+        self.assertEqual(sum(self.simulator.counts.values()), 0)
+
+    def test_invalidate(self):
+        self.simulator.transfer_settings.bit_rate = 1000000
+        self.assertEqual(self.device.transfer_settings.bit_rate, 12000000)
+        self.device.invalidate_settings(['transfer_settings'])
+        self.assertEqual(self.device.transfer_settings.bit_rate, 1000000)
+
+    def test_invalidate_gpio_and_eeprom(self):
+        self.device.gpio_direction.raw = 0x1F0
+        self.device.gpio[0] = 1
+        self.assertEqual(self.device.eeprom[0:1], b'\xff')
+        self.simulator.gpio_value = 0
+        self.simulator.eeprom[0] = 0x12
+        self.device.invalidate_settings()
+        self.assertEqual(self.device.gpio[0], 0)
+        self.assertEqual(self.device.eeprom[0:1], b'\x12')
+
+    def test_invalidate_chip_settings_discards_gpio(self):
+        self.device.gpio_direction.raw = 0x1F0
+        self.device.gpio[0] = 1
+        self.simulator.gpio_value = 0
+        self.device.invalidate_settings(['chip_settings'])
+        self.assertEqual(self.device.gpio[0], 0)
+
+    def test_settings_ttl(self):
+        self.device.settings_ttl = 0
+        self.simulator.transfer_settings.bit_rate = 1000000
+        self.assertEqual(self.device.transfer_settings.bit_rate, 1000000)
+
+    def test_restore_writes_only_changed_settings(self):
+        snapshot = self.device.snapshot_settings(['transfer_settings', 'chip_settings'])
+        settings = self.device.transfer_settings
+        settings.bit_rate = 1000000
+        self.device.transfer_settings = settings
+        self.simulator.counts.clear()
+        self.assertEqual(self.device.restore_settings(snapshot), ['transfer_settings'])
+        self.assertEqual(self.simulator.counts[commands.SetSPISettingsCommand.COMMAND], 1)
+        self.assertEqual(self.simulator.counts[commands.SetChipSettingsCommand.COMMAND], 0)
+        self.assertEqual(self.simulator.transfer_settings.bit_rate, 12000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import io
+import unittest
+from mcp2210 import DeviceDisconnected, SPITransaction, commands
+from tests.support import RecordingPeripheral, payload, simulated_device
+
+
+class TransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RecordingPeripheral()
+        self.simulator, self.device = simulated_device(peripheral=self.peripheral)
+
+    def test_transfer(self):
+        data = payload(1000)
+        self.assertEqual(self.device.transfer(data), data)
+        self.assertEqual(self.peripheral.transactions, [data])
+        self.assertEqual(self.device.last_transfer.length, 1000)
+
+    def test_transfer_accepts_bytes_like_data(self):
+        data = payload(100)
+        self.assertEqual(self.device.transfer(bytearray(data)), data)
+        self.assertEqual(self.device.transfer(memoryview(data)), data)
+
+    def test_transfer_into(self):
+        buffer = bytearray(8)
+        self.assertEqual(self.device.transfer_into(b"data", buffer), 4)
+        self.assertEqual(buffer[:4], bytearray(b"data"))
+
+    def test_transfer_into_rejects_short_buffer(self):
+        with self.assertRaises(ValueError):
+            self.device.transfer_into(b"data", bytearray(2))
+
+    def test_transfer_size_written_only_when_changed(self):
+        self.device.transfer(b"abcd")
+        self.simulator.counts.clear()
+        self.device.transfer(b"efgh")
+        self.assertEqual(self.simulator.counts[commands.SetSPISettingsCommand.COMMAND], 0)
+
+    def test_unchanged_settings_not_written(self):
+        settings = self.device.transfer_settings
+        self.simulator.counts.clear()
+        self.device.transfer_settings = settings
+        self.assertEqual(self.simulator.counts[commands.SetSPISettingsCommand.COMMAND], 0)
+
+    def test_fixed_size_transfer(self):
+        with self.device.fixed_size_transfer(8) as xfer:
+            self.simulator.counts.clear()
+            self.assertEqual(xfer.transfer(b"abcdefgh"), b"abcdefgh")
+            self.assertEqual(xfer.transfer(b"ijklmnop"), b"ijklmnop")
+            with self.assertRaises(ValueError):
+                xfer.transfer(b"abc")
+            self.assertEqual(self.simulator.counts[commands.SetSPISettingsCommand.COMMAND], 0)
+        self.assertEqual(self.peripheral.transactions, [b"abcdefgh", b"ijklmnop"])
+        self.assertEqual(self.device.transfer_settings.spi_tx_size, 4)
+        self.assertEqual(self.simulator.transfer_settings.spi_tx_size, 4)
+
+    def test_fixed_size_transfer_keeps_its_settings(self):
+        with self.device.fixed_size_transfer(8) as xfer:
+            xfer.transfer(b"abcdefgh")
+            self.device.transfer(b"abc")
+            self.assertEqual(xfer.transfer(b"ijklmnop"), b"ijklmnop")
+            self.simulator.counts.clear()
+            self.assertEqual(xfer.transfer(b"qrstuvwx"), b"qrstuvwx")
+            self.assertEqual(self.simulator.counts[commands.GetSPISettingsCommand.COMMAND], 0)
+            self.assertEqual(self.simulator.counts[commands.SetSPISettingsCommand.COMMAND], 0)
+        self.assertEqual(self.peripheral.transactions, [b"abcdefgh", b"abc", b"ijklmnop", b"qrstuvwx"])
+
+    def test_batch(self):
+        transactions = [SPITransaction(0x01, 0, 1000000, b"one"),
+                        SPITransaction(0x02, 0, 1000000, b"two"),
+                        SPITransaction(0x01, 0, 1000000, b"six")]
+        self.assertEqual(self.device.transfer_batch(transactions), [b"one", b"two", b"six"])
+        # Grouped by chip select, so both transactions on 0x01 run first.
+        self.assertEqual(self.peripheral.transactions, [b"one", b"six", b"two"])
+        self.assertEqual(self.device.last_batch.settings_writes, 2)
+        self.assertTrue(self.device.last_batch.restored)
+        self.assertEqual(self.simulator.transfer_settings.active_cs, 0x1FE)
+        self.assertEqual(self.device.transfer(b"data"), b"data")
+
+    def test_batch_in_order(self):
+        transactions = [(0x01, 0, 1000000, b"one"), (0x02, 0, 1000000, b"two"), (0x01, 0, 1000000, b"six")]
+        self.assertEqual(self.device.transfer_batch(transactions, reorder=False), [b"one", b"two", b"six"])
+        self.assertEqual(self.peripheral.transactions, [b"one", b"two", b"six"])
+        self.assertEqual(self.device.last_batch.settings_writes, 3)
+
+    def test_failed_batch_discards_cached_settings(self):
+        self.device.transfer_settings
+        self.simulator.unplug()
+        with self.assertRaises(DeviceDisconnected):
+            self.device.transfer_batch([SPITransaction(0x01, 0, 1000000, b"one")])
+        self.simulator.plug()
+        self.simulator.transfer_settings.bit_rate = 2000000
+        self.assertEqual(self.device.transfer_settings.bit_rate, 2000000)
+
+    def test_oversized_batch_rejected_before_sending(self):
+        self.simulator.counts.clear()
+        with self.assertRaises(ValueError):
+            self.device.transfer_batch([SPITransaction(0x01, 0, 1000000, b"a"),
+                                        SPITransaction(0x01, 0, 1000000, payload(0x10000))])
+        self.assertEqual(sum(self.simulator.counts.values()), 0)
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.peripheral = RecordingPeripheral()
+        self.simulator, self.device = simulated_device(peripheral=self.peripheral)
+
+    def test_oversized_transfer_rejected(self):
+        with self.assertRaises(ValueError):
+            self.device.transfer(payload(0x10000))
+
+    def test_transfer_stream_splits_transactions(self):
+        data = payload(2500)
+        sink = io.BytesIO()
+        self.assertEqual(self.device.transfer_stream(io.BytesIO(data), sink, transaction_size=1000), 2500)
+        self.assertEqual(sink.getvalue(), data)
+        self.assertEqual(self.peripheral.transactions, [data[:1000], data[1000:2000], data[2000:]])
+
+    def test_iter_transfer_with_length(self):
+        data = payload(300)
+        self.assertEqual(b"".join(self.device.iter_transfer(io.BytesIO(data), length=300)), data)
+
+    def test_iter_transfer_from_chunks(self):
+        data = payload(300)
+        chunks = [data[:7], data[7:200], data[200:]]
+        self.assertEqual(b"".join(self.device.iter_transfer(iter(chunks), transaction_size=128)), data)
+        self.assertEqual(self.peripheral.transactions, [data[:128], data[128:256], data[256:]])
+
+    def test_commands_between_chunks(self):
+        data = payload(600)
+        received = []
+        for chunk in self.device.iter_transfer(data):
+            received.append(chunk)
+            self.device.read_event_count()
+        self.assertEqual(b"".join(received), data)
+        self.assertEqual(self.peripheral.transactions, [data])
+
+    def test_closing_iter_transfer_cancels_transaction(self):
+        chunks = self.device.iter_transfer(payload(600))
+        next(chunks)
+        chunks.close()
+        self.assertEqual(self.device.transfer(b"abc"), b"abc")
+        self.assertEqual(self.peripheral.transactions[-1], b"abc")
+
+    def test_breaking_out_of_iter_transfer_cancels_transaction(self):
+        for chunk in self.device.iter_transfer(payload(600)):
+            break
+        del chunk
+        self.assertEqual(self.device.transfer(b"abc"), b"abc")
+
+
+if __name__ == '__main__':
+    unittest.main()